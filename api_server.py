@@ -0,0 +1,267 @@
+"""
+Standalone HTTP API for the search pipeline.
+
+Serves the same engine as the Streamlit app so other services (and a load
+balancer) can call it directly:
+
+    POST /v1/answer   {"question": "...", "bypass_cache": false}  -> JSON answer
+    POST /v1/stream   {"question": "..."}                        -> Server-Sent Events
+    GET  /healthz     liveness probe
+    GET  /readyz      readiness probe (pipeline loaded)
+    GET  /metrics     Prometheus metrics of the worker that took the connection
+
+The listening socket is opened once and shared by pre-forked worker
+processes, each with its own engine and a cap on concurrent requests:
+
+    python api_server.py --port 8000 --workers 4
+
+Metrics are per worker and labelled with its index. With --metrics-port,
+worker i also serves /metrics on metrics-port + i so each can be scraped.
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from engine import check_environment, get_engine, to_json_response
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+API_MAX_CONCURRENCY = int(os.environ.get("API_MAX_CONCURRENCY", 16))
+API_MAX_BODY_BYTES = int(os.environ.get("API_MAX_BODY_BYTES", 64 * 1024))
+API_MAX_QUESTION_CHARS = int(os.environ.get("API_MAX_QUESTION_CHARS", 2000))
+API_METRICS_PORT = int(os.environ.get("API_METRICS_PORT", 0))
+
+
+class BadRequest(ValueError):
+    """ Raised for request bodies the API cannot answer """
+
+
+def _add_label(text: str, name: str, value: str) -> str:
+    """ Add a label to every sample line of a Prometheus text exposition """
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            if "{" in line.split(" ", 1)[0]:
+                line = line.replace("{", f'{{{name}="{value}",', 1)
+            else:
+                metric, sample = line.split(" ", 1)
+                line = f'{metric}{{{name}="{value}"}} {sample}'
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """ Routes API requests to the process-wide engine """
+
+    server_version = "WebWikiSearch/1.0"
+    # Bounds in-flight answer and stream requests in this worker process
+    slots = threading.BoundedSemaphore(API_MAX_CONCURRENCY)
+    # Index of this worker process, set when the worker starts
+    worker = 0
+
+    def log_message(self, format: str, *args) -> None:
+        logger.info(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_question(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > API_MAX_BODY_BYTES:
+            raise BadRequest(f"Request body larger than {API_MAX_BODY_BYTES} bytes")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise BadRequest(f"Invalid JSON: {e}")
+        question = payload.get("question") if isinstance(payload, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise BadRequest("Field 'question' must be a non-empty string")
+        if len(question) > API_MAX_QUESTION_CHARS:
+            raise BadRequest(f"Question longer than {API_MAX_QUESTION_CHARS} characters")
+        return {"question": question.strip(), "bypass_cache": bool(payload.get("bypass_cache", False))}
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/readyz":
+            engine = get_engine()
+            problems = check_environment()
+            if engine.loaded and not problems:
+                self._send_json(200, {"status": "ready"})
+            else:
+                reason = "; ".join(problems) or (str(engine.error) if engine.error else "pipeline loading")
+                self._send_json(503, {"status": "not ready", "reason": reason})
+        elif self.path == "/metrics":
+            self._send_metrics()
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _send_metrics(self) -> None:
+        import metrics
+
+        text = _add_label(metrics.export_prometheus(), "worker", str(self.worker))
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path not in ("/v1/answer", "/v1/stream"):
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            request = self._read_question()
+        except BadRequest as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        if not self.slots.acquire(blocking=False):
+            self._send_json(503, {"error": "Server busy"}, {"Retry-After": "1"})
+            return
+        try:
+            if self.path == "/v1/answer":
+                self._answer(request)
+            else:
+                self._stream(request)
+        finally:
+            self.slots.release()
+
+    def _answer(self, request: Dict[str, Any]) -> None:
+        try:
+            response = get_engine().answer(request["question"], bypass_cache=request["bypass_cache"])
+            self._send_json(200, to_json_response(response))
+        except Exception as e:
+            logger.error(f"Error answering API request: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def _stream(self, request: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+        try:
+            for event in get_engine().stream(request["question"], bypass_cache=request["bypass_cache"]):
+                if event["type"] == "done":
+                    event = {"type": "done", **to_json_response(event)}
+                self._send_event(event["type"], event)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Stream client disconnected")
+        except Exception as e:
+            logger.error(f"Error streaming API request: {e}")
+            self._send_event("error", {"type": "error", "error": str(e)})
+
+    def _send_event(self, name: str, data: Dict[str, Any]) -> None:
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+class MetricsRequestHandler(SearchRequestHandler):
+    """ Serves only /metrics, on a port of its own for each worker """
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send_metrics()
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        self._send_json(404, {"error": "Not found"})
+
+
+def _run_worker(server: ThreadingHTTPServer, index: int = 0, metrics_port: int = 0) -> None:
+    SearchRequestHandler.worker = index
+    if metrics_port:
+        metrics_server = ThreadingHTTPServer((server.server_address[0], metrics_port + index), MetricsRequestHandler)
+        threading.Thread(target=metrics_server.serve_forever, daemon=True).start()
+        logger.info(f"Worker {index} metrics on port {metrics_port + index}")
+    # Each worker loads its own pipeline in the background; /readyz reports when it is done
+    get_engine().warm()
+    logger.info(f"Worker {index} ({os.getpid()}) serving on {server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host: str = "0.0.0.0", port: int = 8000, workers: int = 1, metrics_port: int = API_METRICS_PORT) -> None:
+    """
+    Serve the API, forking `workers` processes that share one listening socket.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind
+        workers: Number of worker processes (1 serves from this process)
+        metrics_port: First port of the per-worker metrics servers (0 disables them)
+    """
+    ThreadingHTTPServer.daemon_threads = True
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    if workers <= 1 or not hasattr(os, "fork"):
+        _run_worker(server, 0, metrics_port)
+        return
+
+    children = []
+    for index in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            _run_worker(server, index, metrics_port)
+            os._exit(0)
+        children.append(pid)
+    logger.info(f"Started {workers} workers: {children}")
+
+    def stop(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        try:
+            os.waitpid(child, 0)
+        except ChildProcessError:
+            pass
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the search pipeline over HTTP")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("API_WORKERS", 1)),
+                        help="Worker processes sharing the listening socket")
+    parser.add_argument("--metrics-port", type=int, default=API_METRICS_PORT,
+                        help="Serve worker i's metrics on this port + i (0 disables)")
+    args = parser.parse_args()
+
+    problems = check_environment()
+    for problem in problems:
+        logger.error(problem)
+    if problems:
+        sys.exit(1)
+    serve(args.host, args.port, args.workers, args.metrics_port)
+
+
+if __name__ == "__main__":
+    main()
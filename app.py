@@ -1,20 +1,24 @@
 import streamlit as st
 import time
 import logging
+import metrics
+import resilience
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Attempt to load the graph module with error handling
-try:
-    from web_wiki_search import graph
-    graph_loaded = True
-    logger.info("Successfully imported web_wiki_search graph")
-except ImportError as e:
-    graph_loaded = False
-    error_message = str(e)
-    logger.error(f"Error importing web_wiki_search graph: {error_message}")
+# Check keys and dependencies up front; the heavy search pipeline itself loads lazily
+from engine import check_environment
+from process_backend import EXECUTION_BACKEND, get_backend
+
+startup_problems = check_environment()
+graph_loaded = not startup_problems
+if graph_loaded:
+    logger.info("Search engine prerequisites present")
+else:
+    error_message = "; ".join(startup_problems)
+    logger.error(f"Search engine unavailable: {error_message}")
     # Try to load fallback
     try:
         import fallback_search
@@ -31,6 +35,16 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
 )
 
+@st.cache_resource(show_spinner=False)
+def load_engine():
+    """ One engine (or worker pool) per server process, warmed in the background so the page renders immediately """
+    engine = get_backend()
+    engine.warm()
+    return engine
+
+if graph_loaded:
+    engine = load_engine()
+
 # Custom CSS to make the app look nicer
 st.markdown("""
 <style>
@@ -125,6 +139,54 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Rolling per-node latency metrics for this server process
+with st.sidebar:
+    st.markdown("### 📈 Pipeline Metrics")
+    if EXECUTION_BACKEND == "process":
+        # Tracing, rate limiting and circuit breaking happen inside the worker processes,
+        # so this process's tracer, limiters and breakers never see a request
+        st.caption("Metrics are not shown with EXECUTION_BACKEND=process: requests are traced, rate limited "
+                   "and circuit-broken inside the worker processes, each with its own counters.")
+    else:
+        snapshot = metrics.export_json()
+        request_stats = snapshot["request_latency_seconds"]
+        if request_stats["count"]:
+            st.caption(f"Last {int(snapshot['window_seconds'] // 60)} minutes · {request_stats['count']} requests")
+            rows = [{"stage": "Request", "p50 (s)": round(request_stats["p50"], 2), "p95 (s)": round(request_stats["p95"], 2)}]
+            for node, node_metrics in snapshot["nodes"].items():
+                latency = node_metrics["node_latency_seconds"]
+                rows.append({
+                    "stage": node.replace("_", " "),
+                    "p50 (s)": round(latency["p50"], 2),
+                    "p95 (s)": round(latency["p95"], 2),
+                    "avg KB": round(node_metrics["node_context_bytes"]["sum"] / max(latency["count"], 1) / 1024, 1),
+                })
+            st.dataframe(rows, hide_index=True)
+            st.download_button("Export Prometheus metrics", metrics.export_prometheus(), file_name="metrics.txt")
+        else:
+            st.caption("No requests traced yet")
+    
+        # Provider rate limiters shared by every session in this process
+        for provider, limits in snapshot["rate_limits"].items():
+            st.caption(f"{provider.title()}: {limits['queue_depth']} queued · "
+                       f"p95 wait {limits['wait_p95']:.2f}s · {limits['timeouts']} timed out")
+        # Identical in-flight questions that shared one graph run
+        for name, coalescing in snapshot["coalescing"].items():
+            st.caption(f"Coalesced {name} runs: {coalescing['coalesced']} of "
+                       f"{coalescing['executions'] + coalescing['coalesced']} "
+                       f"({coalescing['coalesced_rate']:.0%}) · {coalescing['in_flight']} in flight")
+        for table, cache_counts in snapshot["caches"].items():
+            st.caption(f"{table.replace('_', ' ').capitalize()} cache: {cache_counts['hits']} hits · "
+                       f"{cache_counts['misses']} misses ({cache_counts['hit_rate']:.0%}) · "
+                       f"{cache_counts['entries']} entries")
+        semantic = snapshot["semantic_cache"]
+        if semantic is not None:
+            st.caption(f"Semantic cache: {semantic['hits']} hits · {semantic['misses']} misses · "
+                       f"{semantic['rejected']} vetoed · {semantic['entries']} entries")
+        for provider, breaker in resilience.breaker_stats().items():
+            if breaker['state'] != 'closed':
+                st.caption(f"🚧 {provider.title()} circuit {breaker['state'].replace('_', '-')}")
+
 # Initialize session state for query history
 if 'query_history' not in st.session_state:
     st.session_state.query_history = []
@@ -165,6 +227,7 @@ with st.form(key="search_form"):
         query = st.text_input("Enter your question", placeholder="E.g., What is machine learning?")
     with col2:
         search_button = st.form_submit_button("Search")
+    bypass_cache = st.checkbox("Skip cached answers", value=False)
 
 # Query history (if there are previous queries)
 if st.session_state.query_history and not query:
@@ -306,48 +369,115 @@ if search_button and query:
         # Start timer
         start_time = time.time()
         
-        with st.spinner("🔍 Searching web and Wikipedia..."):
-            try:
-                # Process the search query using the graph from web_wiki_search.py
-                response = graph.invoke({"question": query})
+        try:
+            # Display results
+            st.markdown("### 📝 Results")
+            
+            # Fix for answer display - use container and write for better visibility
+            with st.container(border=True):
+                st.subheader("Answer")
+                answer_placeholder = st.empty()
+                answer_placeholder.markdown("🔍 Searching web and Wikipedia...")
+                
+                # Stream the answer through the engine (loads the pipeline if warm-up has not finished)
+                stage_placeholder = st.empty()
+                answer = ""
+                draft = ""
+                draft_node = ""
+                response = {}
+                first_token_time = None
+                for event in engine.stream(query, bypass_cache=bypass_cache):
+                    if event["type"] == "draft_sources":
+                        # A later draft (the cascade's) starts over from the full context
+                        draft = ""
+                        if event.get("stage") == "cascade":
+                            draft_node = "the fast model"
+                            stage_placeholder.caption("✏️ Draft from the fast model, checking it against the sources...")
+                        else:
+                            draft_node = event["node"].replace("_", " ")
+                            stage_placeholder.caption(f"✏️ Draft from {draft_node} while the other sources finish...")
+                    elif event["type"] == "draft_token":
+                        if first_token_time is None:
+                            first_token_time = time.time() - start_time
+                        draft += event["content"]
+                        answer_placeholder.markdown(draft + "▌")
+                    elif event["type"] == "sources" and draft:
+                        stage_placeholder.caption(f"🔄 Refining the draft from {draft_node} with all sources...")
+                    elif event["type"] == "token":
+                        if first_token_time is None:
+                            first_token_time = time.time() - start_time
+                        answer += event["content"]
+                        answer_placeholder.markdown(answer + "▌")
+                    elif event["type"] == "done":
+                        response = event
                 
                 # Calculate time taken
                 time_taken = time.time() - start_time
                 
-                # Extract answer and sources
-                answer = extract_answer(response)
-                sources = format_sources(response)
+                answer_placeholder.markdown(answer or "No answer found")
+                stage_placeholder.empty()
+                cache_note = " (cached)" if response.get('cached') else ""
+                if response.get('matched_question'):
+                    cache_note = f" (cached answer to “{response['matched_question']}”)"
+                ttft_note = f" · first token after {first_token_time:.2f} seconds" if first_token_time is not None else ""
+                st.markdown(f'<div class="timer">⏱️ Answer generated in {time_taken:.2f} seconds{ttft_note}{cache_note}</div>', unsafe_allow_html=True)
                 
-                # Display results
-                st.markdown("### 📝 Results")
+                # Note retrievers that failed or missed their deadline
+                incomplete = [s for s in response.get('retrieval_status', []) if s.get('status') != 'ok']
+                if incomplete:
+                    details = ", ".join(f"{s['node'].replace('_', ' ')} ({s['status']})" for s in incomplete)
+                    st.caption(f"⚠️ Answered without complete results from: {details}")
+
+                if response.get('degraded'):
+                    st.warning("Search providers are currently unavailable, so a fallback answer is shown")
                 
-                # Fix for answer display - use container and write for better visibility
-                with st.container(border=True):
-                    st.subheader("Answer")
-                    st.write(answer)
-                    st.markdown(f'<div class="timer">⏱️ Answer generated in {time_taken:.2f} seconds</div>', unsafe_allow_html=True)
+                # Keep the draft available when the final answer replaced it
+                if draft and draft != answer:
+                    with st.expander(f"✏️ First draft from {draft_node}", expanded=False):
+                        st.markdown(draft)
                 
-                # Display sources if available
-                if sources:
-                    with st.expander("📚 View Sources", expanded=False):
-                        st.markdown("The answer was generated using information from these sources:")
-                        
-                        for source in sources:
-                            title = source.get('title', 'Unknown Source')
-                            url = source.get('url', '')
-                            preview = source.get('content_preview', 'No preview available')
-                            
-                            st.markdown(f"""
-                            <div class="source-card">
-                                <div class="source-title">{title}</div>
-                                <div class="source-url">{url}</div>
-                                <div class="source-preview">{preview}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
+                # Note when the cascade's small model answered without escalating
+                model_route = response.get('model_route') or {}
+                if model_route and not model_route.get('escalated'):
+                    saved = model_route.get('saved_seconds')
+                    saved_note = f", about {saved:.1f}s faster" if saved else ""
+                    st.caption(f"⚡ Answered by {model_route['model']}{saved_note}")
                 
-            except Exception as e:
-                logger.error(f"Error during search: {str(e)}")
-                st.error(f"An error occurred: {str(e)}")
-                st.write("Please try again with a different question.")
+                # Note when a compound question was searched in parts
+                sub_queries = response.get('sub_queries') or []
+                if sub_queries:
+                    st.caption(f"🧩 Searched {len(sub_queries)} parts separately: " + " · ".join(sub_queries))
+                
+                # Note when the router skipped a retriever
+                route = response.get('route') or {}
+                if route.get('route') in ('web', 'wikipedia'):
+                    searched = "the web" if route['route'] == 'web' else "Wikipedia"
+                    st.caption(f"🧭 Searched {searched} only (routing confidence {route['confidence']:.0%})")
+
+            # Extract sources
+            sources = format_sources(response)
+            
+            # Display sources if available
+            if sources:
+                with st.expander("📚 View Sources", expanded=False):
+                    st.markdown("The answer was generated using information from these sources:")
+                    
+                    for source in sources:
+                        title = source.get('title', 'Unknown Source')
+                        url = source.get('url', '')
+                        preview = source.get('content_preview', 'No preview available')
+                        
+                        st.markdown(f"""
+                        <div class="source-card">
+                            <div class="source-title">{title}</div>
+                            <div class="source-url">{url}</div>
+                            <div class="source-preview">{preview}</div>
+                        </div>
+                        """, unsafe_allow_html=True)
+            
+        except Exception as e:
+            logger.error(f"Error during search: {str(e)}")
+            st.error(f"An error occurred: {str(e)}")
+            st.write("Please try again with a different question.")
 
 # Footer removed 
\ No newline at end of file
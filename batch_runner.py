@@ -0,0 +1,173 @@
+"""
+Batch question runner.
+
+Reads questions from a JSONL or CSV file, answers them through the async graph
+with a bounded number of questions in flight, and appends one JSON result per
+line to the output file as each question completes:
+
+    python batch_runner.py questions.jsonl results.jsonl --concurrency 8
+
+Re-running with the same output file skips questions that already have a
+successful result, so an interrupted run can be resumed. Error answers,
+fallback answers and answers from incomplete retrieval are recorded with an
+"error" field so a resumed run retries them.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from engine import answer_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def read_questions(path: str, question_field: str = "question", id_field: str = "id") -> Iterator[Tuple[str, str]]:
+    """
+    Yield (id, question) pairs from a JSONL or CSV file.
+
+    Rows without an id are numbered by their position in the file, so the same
+    input produces the same ids on every run.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as handle:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(handle)
+        else:
+            rows = (json.loads(line) for line in handle if line.strip())
+        for index, row in enumerate(rows):
+            question = (row.get(question_field) or "").strip()
+            if question:
+                yield str(row.get(id_field) or index), question
+
+
+def completed_ids(path: str) -> Set[str]:
+    """ Ids that already have a successful result in the output file """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if not record.get("error"):
+                done.add(str(record.get("id")))
+    return done
+
+
+def _failure_reason(response: Dict[str, Any]) -> Optional[str]:
+    """ Why a response is not a complete answer worth keeping, or None when it is """
+    if response.get("degraded"):
+        return "degraded: answered by the fallback"
+    if response.get("cached"):
+        # Only complete answers are cached
+        return None
+    if not hasattr(response.get("answer"), "content"):
+        # Generation errors come back as an apology string rather than a model message
+        return f"generation failed: {answer_text(response.get('answer'))[:200]}"
+    incomplete = [status for status in response.get("retrieval_status", []) if status.get("status") != "ok"]
+    if incomplete:
+        return "incomplete retrieval: " + ", ".join(f"{status['node']} {status['status']}" for status in incomplete)
+    return None
+
+
+def _result_record(question_id: str, question: str, response: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    sources = [source for source_list in response.get("sources", []) for source in source_list]
+    record = {
+        "id": question_id,
+        "question": question,
+        "answer": answer_text(response.get("answer")),
+        "sources": sources,
+        "timings": {t["node"]: t["seconds"] for t in response.get("timings", [])},
+        "retrieval_status": response.get("retrieval_status", []),
+        "cached": response.get("cached", False),
+        "degraded": response.get("degraded", False),
+        "elapsed": round(elapsed, 3),
+    }
+    error = _failure_reason(response)
+    if error:
+        record["error"] = error
+    return record
+
+
+async def run_batch(questions: List[Tuple[str, str]], output: str, concurrency: int = 4,
+                    bypass_cache: bool = False) -> Dict[str, int]:
+    """
+    Answer questions with at most `concurrency` in flight, appending results to output.
+
+    Returns:
+        Counts of succeeded and failed questions
+    """
+    from web_wiki_search import aanswer_question
+
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"succeeded": 0, "failed": 0}
+
+    with open(output, "a", encoding="utf-8") as out:
+        async def answer_one(question_id: str, question: str):
+            async with semaphore:
+                start_time = time.time()
+                try:
+                    # Batch work yields provider capacity to interactive requests
+                    response = await aanswer_question(question, bypass_cache=bypass_cache, priority="batch")
+                    record = _result_record(question_id, question, response, time.time() - start_time)
+                    if record.get("error"):
+                        logger.warning(f"Question {question_id} will be retried on resume: {record['error']}")
+                        counts["failed"] += 1
+                    else:
+                        counts["succeeded"] += 1
+                except Exception as e:
+                    logger.error(f"Error answering question {question_id}: {e}")
+                    record = {"id": question_id, "question": question, "error": str(e),
+                              "elapsed": round(time.time() - start_time, 3)}
+                    counts["failed"] += 1
+                # Writes happen on the event loop thread, so lines never interleave
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                done = counts["succeeded"] + counts["failed"]
+                if done % 10 == 0 or done == len(questions):
+                    logger.info(f"Completed {done}/{len(questions)} questions")
+
+        await asyncio.gather(*(answer_one(question_id, question) for question_id, question in questions))
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions through the search graph")
+    parser.add_argument("input", help="JSONL or CSV file of questions")
+    parser.add_argument("output", help="JSONL file to append results to")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum questions in flight")
+    parser.add_argument("--question-field", default="question", help="Field holding the question text")
+    parser.add_argument("--id-field", default="id", help="Field holding a stable question id")
+    parser.add_argument("--bypass-cache", action="store_true", help="Ignore cached answers")
+    parser.add_argument("--no-resume", action="store_true", help="Re-run questions already in the output file")
+    args = parser.parse_args()
+
+    questions = list(read_questions(args.input, args.question_field, args.id_field))
+    if not args.no_resume:
+        done = completed_ids(args.output)
+        if done:
+            logger.info(f"Resuming: skipping {len(done)} questions already answered")
+        questions = [(qid, q) for qid, q in questions if qid not in done]
+
+    start_time = time.time()
+    logger.info(f"Answering {len(questions)} questions with concurrency {args.concurrency}")
+    counts = asyncio.run(run_batch(questions, args.output, args.concurrency, args.bypass_cache))
+    logger.info(
+        f"Batch finished in {time.time() - start_time:.2f} seconds: "
+        f"{counts['succeeded']} succeeded, {counts['failed']} failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
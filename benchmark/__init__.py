@@ -0,0 +1,24 @@
+"""
+Offline benchmark suite for the search graph.
+
+Swaps Tavily, Wikipedia and Groq for local stand-ins with configurable
+latency, jitter, payload size and failure rate, then reports end-to-end and
+per-node latency percentiles and throughput. Run with:
+
+    python -m benchmark --requests 200 --concurrency 16
+"""
+
+from benchmark.stubs import BackendProfile, StubChatModel, StubTavilySearchResults, StubWikipediaLoader, install_stubs
+from benchmark.runner import format_report, percentile, run_benchmark, summarize_results
+
+__all__ = [
+    "BackendProfile",
+    "StubChatModel",
+    "StubTavilySearchResults",
+    "StubWikipediaLoader",
+    "format_report",
+    "install_stubs",
+    "percentile",
+    "run_benchmark",
+    "summarize_results",
+]
@@ -0,0 +1,39 @@
+import argparse
+import json
+import logging
+
+from benchmark.runner import format_report, run_benchmark
+from benchmark.stubs import BackendProfile, install_stubs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search graph against offline stub providers")
+    parser.add_argument("--requests", type=int, default=50, help="Number of questions to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions in flight at once")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync", help="Use graph.invoke or ainvoke")
+    parser.add_argument("--web-latency", type=float, default=0.8, help="Mean Tavily latency in seconds")
+    parser.add_argument("--wiki-latency", type=float, default=1.5, help="Mean Wikipedia latency in seconds")
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="Mean Groq latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- jitter in seconds")
+    parser.add_argument("--web-payload", type=int, default=2000, help="Characters per web result")
+    parser.add_argument("--wiki-payload", type=int, default=20000, help="Characters per Wikipedia article")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability each provider call fails")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for jitter and failures")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep per-request pipeline logging")
+    args = parser.parse_args()
+
+    web = BackendProfile(args.web_latency, args.jitter, args.web_payload, args.failure_rate, args.seed)
+    wikipedia = BackendProfile(args.wiki_latency, args.jitter, args.wiki_payload, args.failure_rate, args.seed)
+    llm = BackendProfile(args.llm_latency, args.jitter, 1200, args.failure_rate, args.seed)
+
+    module = install_stubs(web, wikipedia, llm)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    report = run_benchmark(module, args.requests, args.concurrency, args.mode)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Load driver and latency report for the offline benchmark.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+NODES = ["Web_Search", "Wikipedia_Search", "Generate_Answer"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """ Nearest-rank percentile of values (0 for an empty list) """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def summarize_results(results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    """ Latency percentiles, throughput and degraded count for a list of {"elapsed", "response"} results """
+    end_to_end = [r["elapsed"] for r in results]
+    per_node = {node: [] for node in NODES}
+    errors = 0
+    for result in results:
+        for timing in result["response"].get("timings", []):
+            per_node.setdefault(timing["node"], []).append(timing["seconds"])
+        if any(s.get("status") != "ok" for s in result["response"].get("retrieval_status", [])):
+            errors += 1
+    return {
+        "requests": len(results),
+        "wall_time": wall_time,
+        "throughput": len(results) / wall_time if wall_time else 0.0,
+        "degraded": errors,
+        "end_to_end": _summary(end_to_end),
+        "nodes": {node: _summary(values) for node, values in per_node.items()},
+    }
+
+
+def run_benchmark(module, requests: int = 50, concurrency: int = 8, mode: str = "sync") -> Dict[str, Any]:
+    """
+    Drive the graph from create_workflow_graph (or its async twin) and measure latency.
+
+    Each request uses a distinct question so the retrieval caches always miss.
+
+    Args:
+        module: web_wiki_search module returned by install_stubs
+        requests: Number of questions to run
+        concurrency: Questions in flight at once
+        mode: "sync" runs graph.invoke on a thread pool, "async" runs ainvoke on one event loop
+    """
+    questions = [f"benchmark question {i}" for i in range(requests)]
+
+    if mode == "async":
+        graph = module.create_async_workflow_graph()
+
+        async def drive():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(question):
+                async with semaphore:
+                    start_time = time.time()
+                    response = await graph.ainvoke(module.initial_state(question))
+                    return {"elapsed": time.time() - start_time, "response": response}
+
+            return await asyncio.gather(*(one(q) for q in questions))
+
+        start_time = time.time()
+        results = asyncio.run(drive())
+    else:
+        graph = module.create_workflow_graph()
+
+        def one(question):
+            start_time = time.time()
+            response = graph.invoke(module.initial_state(question))
+            return {"elapsed": time.time() - start_time, "response": response}
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, questions))
+
+    return summarize_results(list(results), time.time() - start_time)
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Requests: {report['requests']}  Wall time: {report['wall_time']:.2f}s  "
+        f"Throughput: {report['throughput']:.2f} req/s  Degraded: {report['degraded']}",
+        "",
+        f"{'stage':<18}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+    ]
+    rows = [("end_to_end", report["end_to_end"])] + list(report["nodes"].items())
+    for name, stats in rows:
+        lines.append(
+            f"{name:<18}{stats['count']:>7}{stats['p50']:>9.3f}{stats['p95']:>9.3f}"
+            f"{stats['p99']:>9.3f}{stats['max']:>9.3f}"
+        )
+    return "\n".join(lines)
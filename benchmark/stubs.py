@@ -0,0 +1,157 @@
+"""
+Local stand-ins for the paid providers used by web_wiki_search.
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class BackendProfile:
+    """ Simulated behaviour of one provider """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, payload_size: int = 2000,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.payload_size = payload_size
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def maybe_fail(self, name: str) -> None:
+        if self._random.random() < self.failure_rate:
+            # A connection error, like a real outage, so retries and circuit breakers come into play
+            raise ConnectionError(f"Simulated {name} failure")
+
+    def text(self, topic: str) -> str:
+        """ Filler text of roughly payload_size characters that mentions the topic """
+        sentence = f"This passage discusses {topic} in some detail. "
+        repeats = max(1, self.payload_size // len(sentence))
+        paragraphs = [sentence * 5 for _ in range(max(1, repeats // 5))]
+        return "\n\n".join(paragraphs)[: self.payload_size]
+
+
+class StubTavilySearchResults:
+    """ Drop-in for TavilySearchResults """
+
+    profile = BackendProfile(latency=0.8)
+
+    def __init__(self, max_results: int = 3, **kwargs):
+        self.max_results = max_results
+
+    def _results(self, query: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "url": f"https://example.com/{abs(hash(query)) % 10000}/{i}",
+                "title": f"Result {i} for {query}",
+                "content": self.profile.text(query),
+            }
+            for i in range(self.max_results)
+        ]
+
+    def invoke(self, query: str) -> List[Dict[str, Any]]:
+        time.sleep(self.profile.delay())
+        self.profile.maybe_fail("Tavily")
+        return self._results(query)
+
+    async def ainvoke(self, query: str) -> List[Dict[str, Any]]:
+        await asyncio.sleep(self.profile.delay())
+        self.profile.maybe_fail("Tavily")
+        return self._results(query)
+
+
+class StubWikipediaLoader:
+    """ Drop-in for WikipediaLoader """
+
+    profile = BackendProfile(latency=1.5, payload_size=20000)
+
+    def __init__(self, query: str, load_max_docs: int = 2, **kwargs):
+        self.query = query
+        self.load_max_docs = load_max_docs
+
+    def load(self) -> list:
+        from langchain_core.documents import Document
+
+        time.sleep(self.profile.delay())
+        self.profile.maybe_fail("Wikipedia")
+        return [
+            Document(
+                page_content=self.profile.text(self.query),
+                metadata={"source": f"https://en.wikipedia.org/wiki/Stub_Article_{i}", "title": f"Stub Article {i}"},
+            )
+            for i in range(self.load_max_docs)
+        ]
+
+
+class StubChatModel:
+    """ Drop-in for the ChatGroq instance, supporting invoke, ainvoke and stream """
+
+    def __init__(self, profile: Optional[BackendProfile] = None, chunks: int = 40):
+        self.profile = profile or BackendProfile(latency=2.0, payload_size=1200)
+        self.chunks = chunks
+
+    def invoke(self, messages: list):
+        from langchain_core.messages import AIMessage
+
+        time.sleep(self.profile.delay())
+        self.profile.maybe_fail("Groq")
+        return AIMessage(content=self.profile.text("the answer"))
+
+    async def ainvoke(self, messages: list):
+        from langchain_core.messages import AIMessage
+
+        await asyncio.sleep(self.profile.delay())
+        self.profile.maybe_fail("Groq")
+        return AIMessage(content=self.profile.text("the answer"))
+
+    def stream(self, messages: list) -> Iterator:
+        from langchain_core.messages import AIMessageChunk
+
+        text = self.profile.text("the answer")
+        step = max(1, len(text) // self.chunks)
+        per_chunk = self.profile.delay() / self.chunks
+        self.profile.maybe_fail("Groq")
+        for i in range(0, len(text), step):
+            time.sleep(per_chunk)
+            yield AIMessageChunk(content=text[i:i + step])
+
+
+def install_stubs(web: BackendProfile, wikipedia: BackendProfile, llm: BackendProfile):
+    """
+    Import web_wiki_search with every provider replaced by a stub.
+
+    Dummy API keys satisfy the import-time checks and caches point at a fresh
+    temporary database so earlier runs cannot turn requests into cache hits.
+    Rate limiting is off by default and the query log is disabled.
+
+    Returns:
+        The patched web_wiki_search module
+    """
+    os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "offline-benchmark")
+    os.environ["WIKIPEDIA_BACKEND"] = "live"
+    os.environ["WIKIPEDIA_MODE"] = "full"
+    os.environ["SEARCH_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="wws-bench-"), "cache.db")
+    # Stub providers have no quotas, and stub traffic should not land in the query log
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("TAVILY_REQUESTS_PER_MINUTE", "0")
+    os.environ["QUERY_LOG_ENABLED"] = "false"
+
+    import web_wiki_search
+
+    StubTavilySearchResults.profile = web
+    StubWikipediaLoader.profile = wikipedia
+    web_wiki_search.TavilySearchResults = StubTavilySearchResults
+    web_wiki_search.WikipediaLoader = StubWikipediaLoader
+    web_wiki_search.llm = StubChatModel(llm)
+    if web_wiki_search.small_llm is not None:
+        # The cascade's small model answers in a fraction of the large model's time
+        small = BackendProfile(llm.latency / 4, llm.jitter / 4, llm.payload_size, llm.failure_rate)
+        web_wiki_search.small_llm = StubChatModel(small)
+    return web_wiki_search
@@ -0,0 +1,240 @@
+"""
+Disk-backed caches for the search pipeline.
+
+Entries live in a small SQLite database so they survive restarts and are
+shared by every Streamlit session and worker process on the host. Each cache
+is a table with its own TTL and LRU size limit.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.environ.get("SEARCH_CACHE_PATH", "search_cache.db")
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", 24 * 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 5000))
+
+# Per-retriever budgets: web results go stale within hours, Wikipedia articles within days
+RETRIEVAL_CACHE_SETTINGS = {
+    "web": {
+        "ttl": float(os.environ.get("WEB_CACHE_TTL", 60 * 60)),
+        "max_entries": int(os.environ.get("WEB_CACHE_MAX_ENTRIES", 5000)),
+    },
+    "wikipedia": {
+        "ttl": float(os.environ.get("WIKIPEDIA_CACHE_TTL", 3 * 24 * 60 * 60)),
+        "max_entries": int(os.environ.get("WIKIPEDIA_CACHE_MAX_ENTRIES", 2000)),
+    },
+}
+RETRIEVAL_CACHE_SETTINGS["wikipedia_summary"] = RETRIEVAL_CACHE_SETTINGS["wikipedia"]
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question so trivially different spellings share a cache key.
+
+    Args:
+        question: Raw question text as typed by the user
+
+    Returns:
+        Lower-cased question with collapsed whitespace and no trailing punctuation
+    """
+    text = re.sub(r"\s+", " ", (question or "").strip().lower())
+    return text.rstrip("?!. ")
+
+
+class SQLiteTTLCache:
+    """ JSON key/value cache stored in one SQLite table with TTL and LRU eviction """
+
+    def __init__(self, table: str, ttl: float, max_entries: int, path: str = CACHE_PATH):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"Invalid cache table name: {table}")
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, "
+                "label TEXT, "
+                "value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "last_access REAL NOT NULL, "
+                "hit_count INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)"
+            )
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """ Return the cached value for key, or None if missing or expired """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (now, key),
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, label: Optional[str] = None) -> None:
+        """ Store value under key and evict least recently used entries past the size limit """
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} "
+                "(key, label, value, created_at, last_access, hit_count) VALUES (?, ?, ?, ?, ?, 0)",
+                (key, label, payload, now, now),
+            )
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,)
+            )
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def remaining_ttl(self, key: str) -> Optional[float]:
+        """ Seconds until the entry for key expires, or None if missing or expired; not counted as a lookup """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        remaining = row[0] + self.ttl - time.time()
+        return remaining if remaining > 0 else None
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "table": self.table,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class AnswerCache(SQLiteTTLCache):
+    """ Cache of final answers keyed on the normalized question """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 path: str = CACHE_PATH):
+        super().__init__("answers", ttl, max_entries, path)
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        normalized = normalize_question(question)
+        value = self.get(self.make_key(normalized))
+        if value is not None:
+            logger.info(f"Answer cache hit for: {normalized}")
+        return value
+
+    def store(self, question: str, answer: str, sources: list) -> None:
+        normalized = normalize_question(question)
+        self.set(self.make_key(normalized), {"answer": answer, "sources": sources}, label=normalized)
+
+    def expires_in(self, question: str) -> Optional[float]:
+        return self.remaining_ttl(self.make_key(normalize_question(question)))
+
+
+class RetrievalCache(SQLiteTTLCache):
+    """ Cache of one retriever's formatted context and sources keyed on the normalized question """
+
+    def __init__(self, name: str, ttl: float, max_entries: int, path: str = CACHE_PATH):
+        super().__init__(f"retrieval_{name}", ttl, max_entries, path)
+        self.name = name
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        normalized = normalize_question(question)
+        value = self.get(self.make_key(normalized))
+        if value is not None:
+            logger.info(f"{self.name} retrieval cache hit for: {normalized}")
+        return value
+
+    def store(self, question: str, context: str, sources: list) -> None:
+        normalized = normalize_question(question)
+        self.set(self.make_key(normalized), {"context": context, "sources": sources}, label=normalized)
+
+
+_answer_cache: Optional[AnswerCache] = None
+_retrieval_caches: Dict[str, RetrievalCache] = {}
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """ Return the process-wide answer cache, opening it on first use """
+    global _answer_cache
+    with _cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+        return _answer_cache
+
+
+def get_retrieval_cache(name: str) -> RetrievalCache:
+    """ Return the process-wide cache for the named retriever ("web" or "wikipedia") """
+    with _cache_lock:
+        if name not in _retrieval_caches:
+            settings = RETRIEVAL_CACHE_SETTINGS[name]
+            _retrieval_caches[name] = RetrievalCache(name, settings["ttl"], settings["max_entries"])
+        return _retrieval_caches[name]
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """ Stats of the answer and retrieval caches opened in this process, by table """
+    with _cache_lock:
+        caches: List[SQLiteTTLCache] = [_answer_cache] if _answer_cache is not None else []
+        caches += list(_retrieval_caches.values())
+    return {cache.table: cache.stats() for cache in caches}
+
+
+def export_prometheus(prefix: str = "web_wiki_search") -> str:
+    """ Render cache hits, misses and entries in the Prometheus text exposition format """
+    stats = cache_stats()
+    lines = []
+    for metric, key, kind in (("cache_hits_total", "hits", "counter"),
+                              ("cache_misses_total", "misses", "counter"),
+                              ("cache_entries", "entries", "gauge")):
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for table, values in stats.items():
+            lines.append(f'{prefix}_{metric}{{cache="{table}"}} {values[key]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,237 @@
+"""
+Popularity-driven cache warming.
+
+Traffic is dominated by a few hundred recurring questions. The warmer ranks
+questions in the query log by recency-weighted frequency and answers the top
+ones ahead of demand, so their answers are in the answer cache after a restart
+and are refreshed before their TTL lapses. Cold questions are only warmed
+during the configured off-peak hours; answers about to expire are refreshed
+at any time. Every cycle stops at a budget of provider calls.
+
+The warmer runs as its own process with its own rate limiters, so it does not
+queue behind interactive requests; give it a share of the provider quota with
+GROQ_REQUESTS_PER_MINUTE and TAVILY_REQUESTS_PER_MINUTE and lower the servers'
+limits by the same amount.
+
+    python cache_warmer.py             # warm every CACHE_WARMER_INTERVAL seconds
+    python cache_warmer.py --dry-run   # show what the next cycle would warm
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from cache import get_answer_cache, normalize_question
+from query_log import QUERY_LOG_PATH, iter_log
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_WARMER_TOP_N = int(os.environ.get("CACHE_WARMER_TOP_N", 200))
+# Provider calls (retrievers and LLM, retries included) one cycle may spend
+CACHE_WARMER_CALL_BUDGET = int(os.environ.get("CACHE_WARMER_CALL_BUDGET", 300))
+CACHE_WARMER_INTERVAL = float(os.environ.get("CACHE_WARMER_INTERVAL", 15 * 60))
+# Answers expiring within this many seconds are refreshed
+CACHE_WARMER_REFRESH_AHEAD = float(os.environ.get("CACHE_WARMER_REFRESH_AHEAD", 2 * CACHE_WARMER_INTERVAL))
+# A question asked this many seconds ago counts half as much as one asked now
+CACHE_WARMER_HALF_LIFE = float(os.environ.get("CACHE_WARMER_HALF_LIFE", 24 * 60 * 60))
+# Local hours in which cold questions are warmed, e.g. "1-6" or "22-5"; empty means any hour
+CACHE_WARMER_HOURS = os.environ.get("CACHE_WARMER_HOURS", "1-6")
+CACHE_WARMER_CONCURRENCY = int(os.environ.get("CACHE_WARMER_CONCURRENCY", 2))
+# Assumed cost of one question until the cycle has measured its own
+DEFAULT_CALLS_PER_QUESTION = 4
+
+
+def popular_questions(records: Iterable[Dict[str, Any]], top_n: int = CACHE_WARMER_TOP_N,
+                      half_life: float = CACHE_WARMER_HALF_LIFE, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Rank logged questions by exponentially decayed request count.
+
+    Args:
+        records: Query log records
+        top_n: Number of questions to return
+        half_life: Age in seconds at which a request counts half
+        now: Reference time, defaulting to the current time
+
+    Returns:
+        {"question", "normalized", "requests", "score"} dicts, most popular first
+    """
+    now = time.time() if now is None else now
+    # Requests older than ten half-lives add less than 0.1% each
+    horizon = now - 10 * half_life
+    ranked: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        question = (record.get("question") or "").strip()
+        ts = record.get("ts", now)
+        if not question or ts < horizon:
+            continue
+        normalized = normalize_question(question)
+        entry = ranked.setdefault(normalized, {"question": question, "normalized": normalized, "requests": 0,
+                                               "score": 0.0, "last_seen": ts})
+        entry["requests"] += 1
+        entry["score"] += math.pow(0.5, max(now - ts, 0.0) / half_life)
+        if ts >= entry["last_seen"]:
+            # Warm the most recent phrasing
+            entry["question"], entry["last_seen"] = question, ts
+    top = sorted(ranked.values(), key=lambda entry: entry["score"], reverse=True)[:top_n]
+    return [{"question": entry["question"], "normalized": entry["normalized"], "requests": entry["requests"],
+             "score": round(entry["score"], 3)} for entry in top]
+
+
+def in_hours(spec: str, hour: int) -> bool:
+    """ Whether a local hour falls in an "start-end" range (end inclusive, may wrap past midnight) """
+    if not spec.strip():
+        return True
+    start, _, end = spec.partition("-")
+    start, end = int(start), int(end or start)
+    return start <= hour <= end if start <= end else hour >= start or hour <= end
+
+
+class CacheWarmer:
+    """ Answers popular questions ahead of demand within a provider-call budget per cycle """
+
+    def __init__(self, log_path: str = QUERY_LOG_PATH, top_n: int = CACHE_WARMER_TOP_N,
+                 call_budget: int = CACHE_WARMER_CALL_BUDGET, refresh_ahead: float = CACHE_WARMER_REFRESH_AHEAD,
+                 hours: str = CACHE_WARMER_HOURS, concurrency: int = CACHE_WARMER_CONCURRENCY):
+        self.log_path = log_path
+        self.top_n = top_n
+        self.call_budget = call_budget
+        self.refresh_ahead = refresh_ahead
+        self.hours = hours
+        self.concurrency = concurrency
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+
+    def plan(self, off_peak: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """
+        Popular questions with their cache state and whether this cycle should warm them.
+
+        Args:
+            off_peak: Whether cold questions may be warmed; defaults to the current hour
+
+        Returns:
+            Ranked questions, each with "state" ("cold", "expiring" or "fresh"), "expires_in" and "warm"
+        """
+        if off_peak is None:
+            off_peak = in_hours(self.hours, time.localtime().tm_hour)
+        if not os.path.exists(self.log_path):
+            logger.info(f"No query log at {self.log_path}; nothing to warm")
+            return []
+        answer_cache = get_answer_cache()
+        plan = []
+        for entry in popular_questions(iter_log(self.log_path, include_rotated=True), self.top_n):
+            expires_in = answer_cache.expires_in(entry["question"])
+            if expires_in is None:
+                state = "cold"
+            elif expires_in < self.refresh_ahead:
+                state = "expiring"
+            else:
+                state = "fresh"
+            # Refreshes keep hot answers from lapsing at peak; cold questions wait for off-peak hours
+            warm = state == "expiring" or (state == "cold" and off_peak)
+            plan.append({**entry, "state": state,
+                         "expires_in": round(expires_in) if expires_in is not None else None, "warm": warm})
+        return plan
+
+    def _warm_one(self, entry: Dict[str, Any]) -> bool:
+        from web_wiki_search import refresh_answer
+
+        try:
+            refresh_answer(entry["question"])
+        except Exception as e:
+            logger.error(f"Error warming '{entry['question']}': {e}")
+            return False
+        # Incomplete retrieval and errors are not cached, so only a renewed entry counts
+        expires_in = get_answer_cache().expires_in(entry["question"])
+        return expires_in is not None and (entry["expires_in"] is None or expires_in > entry["expires_in"])
+
+    def run_once(self, off_peak: Optional[bool] = None) -> Dict[str, Any]:
+        """ Run one warming cycle and return its report """
+        from resilience import provider_calls
+
+        started_at = time.time()
+        plan = self.plan(off_peak)
+        to_warm = [entry for entry in plan if entry["warm"]]
+        calls_before = provider_calls()
+        warmed, failed, attempted = 0, 0, 0
+        with ThreadPoolExecutor(max_workers=max(self.concurrency, 1), thread_name_prefix="cache-warmer") as pool:
+            while attempted < len(to_warm):
+                spent = provider_calls() - calls_before
+                per_question = spent / attempted if attempted and spent else DEFAULT_CALLS_PER_QUESTION
+                affordable = int((self.call_budget - spent) // per_question)
+                if affordable <= 0:
+                    logger.info(f"Cache warming budget reached after {spent} provider calls")
+                    break
+                batch = to_warm[attempted:attempted + min(affordable, self.concurrency)]
+                results = list(pool.map(self._warm_one, batch))
+                attempted += len(batch)
+                warmed += sum(results)
+                failed += len(results) - sum(results)
+        report = {
+            "candidates": len(plan),
+            "cold": sum(1 for entry in plan if entry["state"] == "cold"),
+            "expiring": sum(1 for entry in plan if entry["state"] == "expiring"),
+            "queued": len(to_warm),
+            "warmed": warmed,
+            "failed": failed,
+            "deferred": len(to_warm) - attempted,
+            "provider_calls": provider_calls() - calls_before,
+            "call_budget": self.call_budget,
+            "elapsed": round(time.time() - started_at, 3),
+        }
+        logger.info(f"Cache warming cycle: {report}")
+        self.last_report = report
+        return report
+
+    def run_forever(self, interval: float = CACHE_WARMER_INTERVAL) -> None:
+        """ Run a cycle every `interval` seconds until stop() is called """
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error in cache warming cycle: {e}")
+            self._stop.wait(interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the answers to popular questions cached")
+    parser.add_argument("--log", default=QUERY_LOG_PATH, help="Query log to rank questions from")
+    parser.add_argument("--top", type=int, default=CACHE_WARMER_TOP_N, help="Number of popular questions to keep warm")
+    parser.add_argument("--budget", type=int, default=CACHE_WARMER_CALL_BUDGET, help="Provider calls per cycle")
+    parser.add_argument("--interval", type=float, default=CACHE_WARMER_INTERVAL, help="Seconds between cycles")
+    parser.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+    parser.add_argument("--off-peak", action="store_true", help="Warm cold questions regardless of the hour")
+    parser.add_argument("--dry-run", action="store_true", help="Print the warming plan without answering anything")
+    args = parser.parse_args()
+
+    warmer = CacheWarmer(args.log, args.top, args.budget)
+    off_peak = True if args.off_peak else None
+    if args.dry_run:
+        for entry in warmer.plan(off_peak):
+            action = "warm" if entry["warm"] else "skip"
+            expires = f"{entry['expires_in']}s" if entry["expires_in"] is not None else "-"
+            print(f"{action:4}  {entry['state']:8}  {entry['score']:8.2f}  {expires:>8}  {entry['question']}")
+        return
+    if args.once:
+        print(json.dumps(warmer.run_once(off_peak), indent=2))
+        return
+    if args.off_peak:
+        warmer.hours = ""
+    try:
+        warmer.run_forever(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
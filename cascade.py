@@ -0,0 +1,109 @@
+"""
+Small-model-first answer cascade.
+
+A small, fast model answers first. A local grounding check then compares the
+draft with the retrieved context; drafts that are poorly supported by the
+context, or that say the context was insufficient, are escalated to the large
+model. Each request reports which model answered and the latency this saved
+(or cost) compared with the large model's recent typical latency.
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, Optional
+
+from passages import tokenize
+from tracing import LATENCY_BUCKETS, RollingHistogram
+from wikipedia_tiers import answer_reports_insufficient
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CASCADE_ENABLED = os.environ.get("CASCADE_ENABLED", "true").lower() == "true"
+CASCADE_SMALL_MODEL = os.environ.get("CASCADE_SMALL_MODEL", "llama-3.1-8b-instant")
+CASCADE_LARGE_MODEL = os.environ.get("CASCADE_LARGE_MODEL", "llama-3.3-70b-versatile")
+# Share of the draft's sentences that must be supported by the context to accept it
+CASCADE_MIN_GROUNDING = float(os.environ.get("CASCADE_MIN_GROUNDING", 0.7))
+# Share of a sentence's terms that must appear in the context for it to count as supported
+SENTENCE_SUPPORT = 0.6
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Recent large-model generation latencies, the baseline for reporting time saved
+large_model_latency = RollingHistogram(LATENCY_BUCKETS, window=3600.0)
+
+
+def grounding_score(answer: str, context: str) -> float:
+    """
+    Share of the answer's sentences whose terms mostly appear in the context.
+
+    Args:
+        answer: Generated answer text
+        context: The context the answer was generated from
+
+    Returns:
+        A score between 0 and 1; 0 for an empty answer
+    """
+    context_terms = set(tokenize(context))
+    sentences = [tokenize(s) for s in SENTENCE_PATTERN.split(answer)]
+    # Very short fragments (list markers, headings) carry no evidence either way
+    sentences = [terms for terms in sentences if len(terms) >= 3]
+    if not sentences:
+        return 0.0
+    supported = sum(
+        1 for terms in sentences
+        if sum(1 for term in terms if term in context_terms) / len(terms) >= SENTENCE_SUPPORT
+    )
+    return supported / len(sentences)
+
+
+def assess_draft(answer: str, context: str, min_grounding: float = CASCADE_MIN_GROUNDING) -> Dict[str, Any]:
+    """ Decide whether a small-model draft can be returned or must be escalated """
+    if answer_reports_insufficient(answer):
+        return {"escalate": True, "grounding": None, "reason": "draft reports insufficient context"}
+    score = grounding_score(answer, context)
+    if score < min_grounding:
+        return {"escalate": True, "grounding": round(score, 3), "reason": f"grounding {score:.2f} below {min_grounding:.2f}"}
+    return {"escalate": False, "grounding": round(score, 3), "reason": "grounded"}
+
+
+def typical_large_latency() -> Optional[float]:
+    """ Median recent large-model latency, or None before any large-model call """
+    snapshot = large_model_latency.snapshot()
+    return snapshot["p50"] if snapshot["count"] else None
+
+
+def routing_report(assessment: Optional[Dict[str, Any]], small_seconds: float,
+                   large_seconds: Optional[float]) -> Dict[str, Any]:
+    """
+    Summarize one cascade run.
+
+    Args:
+        assessment: Result of assess_draft, or None when the draft failed outright
+        small_seconds: Small-model latency
+        large_seconds: Large-model latency when escalated, otherwise None
+
+    Returns:
+        Which model answered, why, and the latency saved relative to the large model
+    """
+    escalated = large_seconds is not None
+    if escalated:
+        large_model_latency.observe(large_seconds)
+        # The draft was wasted time on top of the large model's answer
+        saved = -small_seconds
+    else:
+        typical = typical_large_latency()
+        saved = typical - small_seconds if typical is not None else None
+    report = {
+        "model": CASCADE_LARGE_MODEL if escalated else CASCADE_SMALL_MODEL,
+        "escalated": escalated,
+        "reason": assessment["reason"] if assessment else "draft failed",
+        "grounding": assessment["grounding"] if assessment else None,
+        "small_seconds": round(small_seconds, 3),
+        "large_seconds": round(large_seconds, 3) if escalated else None,
+        "saved_seconds": round(saved, 3) if saved is not None else None,
+    }
+    logger.info(f"Cascade answered with {report['model']} ({report['reason']}; saved {report['saved_seconds']}s)")
+    return report
@@ -0,0 +1,167 @@
+"""
+Sub-query decomposition for multi-part questions.
+
+A compound question such as "compare the economies of France and Germany" or
+"What is CRISPR and how is Cas9 delivered into cells?" searches poorly as one
+string. A local rule-based splitter turns it into focused sub-queries
+("the economies of France", "the economies of Germany"), each of which is
+searched separately alongside the whole question; the answer is still
+generated for the original question from the merged context. The rules split
+only where the reading is unambiguous: names such as "rock and roll" or
+"Procter and Gamble" look exactly like two items, so a list joined only by
+"and" is split at a single "and" or not at all. Questions that match no rule
+are left whole.
+"""
+
+import logging
+import os
+import re
+from typing import List
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DECOMPOSE_ENABLED = os.environ.get("DECOMPOSE_ENABLED", "true").lower() == "true"
+DECOMPOSE_MAX_SUBQUERIES = int(os.environ.get("DECOMPOSE_MAX_SUBQUERIES", 4))
+# Sub-query retrievals in flight at once for one request
+DECOMPOSE_CONCURRENCY = int(os.environ.get("DECOMPOSE_CONCURRENCY", 4))
+
+# "compare X to Y", "compare X and Y", "contrast X, Y and Z", "difference between X and Y", "how does X compare to Y"
+COMPARISON_PATTERNS = [
+    # "to" and "with" only separate the two sides in this slot; elsewhere they belong to the item ("living with parents")
+    re.compile(r"^(?:please\s+)?(?:compare|contrast)\s+(?P<items>.+)\s+to\s+(?P<other>.+)$", re.I),
+    re.compile(r"^(?:please\s+)?(?:compare|contrast)\s+(?P<items>.+?)\s+with\s+(?P<other>.+)$", re.I),
+    re.compile(r"^(?:please\s+)?(?:compare|contrast)\s+(?P<items>.+)$", re.I),
+    re.compile(r"^(?:what(?:'s| is| are)\s+)?(?:the\s+)?(?:main\s+|key\s+)?(?:differences?|similarities)\s+"
+               r"(?:between|among)\s+(?P<items>.+)$", re.I),
+    re.compile(r"^how\s+(?:does|do|did)\s+(?P<items>.+?)\s+compare(?:\s+(?:to|with)\s+(?P<other>.+))?$", re.I),
+]
+LIST_SEPARATOR = re.compile(r"\s*,\s*(?:and\s+)?", re.I)
+AND_SEPARATOR = re.compile(r"\s+and\s+", re.I)
+VERSUS_SEPARATOR = re.compile(r"\s+(?:vs\.?|versus)\s+", re.I)
+VERSUS_PATTERN = re.compile(r"^(?P<first>.+?)\s+(?:vs\.?|versus)\s+(?P<second>.+)$", re.I)
+# A shared topic such as "the economies of" in "the economies of X and Y"
+TOPIC_PREFIX = re.compile(r"^(?P<topic>(?:the\s+)?[\w\s-]+?\s+(?:of|in|for))\s+(?P<item>.+)$", re.I)
+# An item that is a noun phrase of its own ("the Federal Reserve") rather than a bare name the topic applies to
+OWN_PHRASE = re.compile(r"^(?:the|a|an)\s|\s(?:of|in|for)\s", re.I)
+# A shared aspect such as "'s economy" in "X and Y's economy"
+POSSESSIVE_ASPECT = re.compile(r"^(?P<item>.+?)(?:'s|s')\s+(?P<aspect>.+)$", re.I)
+# A trailing qualifier such as "in terms of GDP" that applies to every item
+SHARED_SUFFIX = re.compile(r"^(?P<item>.+?)\s+"
+                           r"(?P<suffix>(?:in terms of|with respect to|regarding|when it comes to)\s+.+)$", re.I)
+
+QUESTION_WORDS = r"(?:what|who|whom|whose|when|where|why|how|which|is|are|was|were|does|do|did|can|could|should)"
+# Independent questions joined by "?", ";" or "and" followed by a new question word
+CLAUSE_SEPARATOR = re.compile(rf"\?\s+|;\s+|,?\s+(?:and|also)\s+(?={QUESTION_WORDS}\b)", re.I)
+# A clause that leans on an earlier one cannot be searched on its own
+DEPENDENT_CLAUSE = re.compile(r"\b(it|its|they|them|their|this|that|these|those|he|she|his|her|one|ones)\b", re.I)
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip(" ?!.,;:")
+
+
+def _split_list(items: str) -> List[str]:
+    """ Split "X, Y and Z" or "X vs Y" into items, or return [] when an "and" could be part of a name """
+    parts = [_clean(part) for part in VERSUS_SEPARATOR.split(items)]
+    if len(parts) > 1:
+        return parts
+    parts = [_clean(part) for part in LIST_SEPARATOR.split(items)]
+    # Commas delimit items, so only the last one can still hold the final "and"
+    last = AND_SEPARATOR.split(parts[-1])
+    if len(last) == 2:
+        parts[-1:] = [_clean(part) for part in last]
+    elif len(last) > 2:
+        # "rock and roll and jazz" or "Procter and Gamble and Unilever" cannot be told apart
+        return []
+    return parts
+
+
+def _shared_topic(parts: List[str]):
+    """ The topic of the first item when it clearly belongs to every item, e.g. "the economies of" """
+    topic = TOPIC_PREFIX.match(parts[0])
+    if not topic:
+        return None
+    words = topic.group("topic").split()[:-1]
+    # A capitalized word makes it a name ("the Bank of England"); acronyms such as "GDP" are fine
+    if any(word[0].isupper() and not word.isupper() for word in words if word.lower() != "the"):
+        return None
+    if any(OWN_PHRASE.search(part) for part in parts[1:]):
+        return None
+    return topic
+
+
+def _split_items(items: str, other: str = "") -> List[str]:
+    """ Split "X, Y and Z's economy" into searchable items, sharing a topic, aspect or qualifier among them """
+    suffix = ""
+    match = SHARED_SUFFIX.match(other or items)
+    if match:
+        suffix = " " + match.group("suffix")
+        if other:
+            other = match.group("item")
+        else:
+            items = match.group("item")
+    # The two sides of "compare X to Y" are taken whole
+    parts = [_clean(items), _clean(other)] if other else _split_list(items)
+    parts = [part for part in parts if part]
+    if len(parts) < 2:
+        return []
+
+    topic = _shared_topic(parts)
+    if topic:
+        parts[0] = topic.group("item")
+        parts = [f"{topic.group('topic')} {part}" for part in parts]
+    aspect = POSSESSIVE_ASPECT.match(parts[-1])
+    if aspect and not POSSESSIVE_ASPECT.match(parts[0]):
+        parts[-1] = aspect.group("item")
+        parts = [f"{part} {aspect.group('aspect')}" for part in parts]
+    return [part + suffix for part in parts]
+
+
+def _split_comparison(text: str) -> List[str]:
+    for pattern in COMPARISON_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return _split_items(match.group("items"), match.groupdict().get("other") or "")
+    match = VERSUS_PATTERN.match(text)
+    if match:
+        return [_clean(match.group("first")), _clean(match.group("second"))]
+    return []
+
+
+def _split_clauses(text: str) -> List[str]:
+    clauses = [_clean(clause) for clause in CLAUSE_SEPARATOR.split(text)]
+    clauses = [clause for clause in clauses if clause]
+    # Every clause after the first must stand on its own and be more than a fragment
+    if len(clauses) < 2 or any(len(clause.split()) < 3 for clause in clauses):
+        return []
+    if any(DEPENDENT_CLAUSE.search(clause) for clause in clauses[1:]):
+        return []
+    return clauses
+
+
+def decompose_question(question: str, max_parts: int = DECOMPOSE_MAX_SUBQUERIES) -> List[str]:
+    """
+    Split a multi-part question into sub-queries.
+
+    Args:
+        question: The user's question
+        max_parts: Maximum number of sub-queries
+
+    Returns:
+        Two or more sub-queries, or an empty list when the question should be searched whole
+    """
+    text = _clean(question)
+    parts = _split_comparison(text) or _split_clauses(text)
+    # Drop repeats while keeping the order
+    unique = {}
+    for part in parts:
+        unique.setdefault(part.lower(), part)
+    parts = list(unique.values())
+    if len(parts) < 2:
+        return []
+    if len(parts) > max_parts:
+        logger.info(f"Keeping the first {max_parts} of {len(parts)} sub-queries")
+        parts = parts[:max_parts]
+    return parts
@@ -0,0 +1,177 @@
+"""
+Cross-source deduplication of retrieved documents.
+
+Web results frequently repeat the Wikipedia articles fetched by the Wikipedia
+retriever, or mirrors of them. Documents are compared on hashed word shingles;
+a document whose shingles are mostly contained in another one is dropped and
+the longer of the two is kept. Source URLs are canonicalized so the same page
+reached through different URLs is listed once.
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+from passages import DOCUMENT_PATTERN
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Share of a document's shingles found in another document above which it counts as a duplicate
+DEDUPE_THRESHOLD = float(os.environ.get("DEDUPE_THRESHOLD", 0.8))
+SHINGLE_SIZE = int(os.environ.get("DEDUPE_SHINGLE_SIZE", 5))
+
+URL_ATTR_PATTERN = re.compile(r'\b(?:href|url)="([^"]*)"')
+WORD_PATTERN = re.compile(r"\w+")
+TRACKING_PARAMS = {"gclid", "fbclid", "mc_cid", "mc_eid", "ref", "ref_src", "oldid"}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so that equivalent addresses of one page compare equal.
+
+    Lower-cases the host, drops "www." and mobile Wikipedia hosts, forces https,
+    removes fragments, tracking parameters and trailing slashes, and decodes
+    percent-escapes in Wikipedia titles.
+
+    Args:
+        url: The URL as returned by a retriever
+
+    Returns:
+        The canonical form, or an empty string for an empty URL
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    host = host.replace(".m.wikipedia.org", ".wikipedia.org")
+
+    path = parts.path.rstrip("/") or "/"
+    if host.endswith("wikipedia.org"):
+        path = unquote(path).replace(" ", "_")
+
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """ Hashed word n-grams of the text; short texts fall back to single words """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {hash(word) for word in words}
+    return {hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def containment(a: Set[int], b: Set[int]) -> float:
+    """ Share of the smaller shingle set that also appears in the larger one """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+class _Doc:
+    def __init__(self, chunk_index: int, attrs: str, body: str):
+        self.chunk_index = chunk_index
+        self.attrs = attrs
+        self.body = body
+        match = URL_ATTR_PATTERN.search(attrs)
+        self.url = canonicalize_url(match.group(1)) if match else ""
+        self.shingles = shingles(body)
+        self.kept = True
+
+
+def _mark_duplicates(docs: List[_Doc], threshold: float) -> None:
+    """ Drop every document that is near-contained in another, keeping the longer one """
+    kept: List[_Doc] = []
+    for doc in docs:
+        for other in kept:
+            if containment(doc.shingles, other.shingles) < threshold:
+                continue
+            if len(doc.shingles) > len(other.shingles):
+                other.kept = False
+                kept.remove(other)
+                kept.append(doc)
+            else:
+                doc.kept = False
+            break
+        else:
+            kept.append(doc)
+
+
+def _filter_sources(sources: list, dropped_urls: Set[str], kept_urls: Set[str]) -> list:
+    """ Remove sources of dropped documents and repeated canonical URLs, keeping the per-retriever grouping """
+    seen: Set[str] = set()
+    filtered = []
+    for source_list in sources:
+        unique = []
+        for source in source_list:
+            url = canonicalize_url(source.get("url") or "")
+            if url and (url in seen or (url in dropped_urls and url not in kept_urls)):
+                continue
+            if url:
+                seen.add(url)
+            unique.append(source)
+        filtered.append(unique)
+    return filtered
+
+
+def dedupe_context(context: List[str], sources: list,
+                   threshold: Optional[float] = None) -> Tuple[List[str], list, Dict[str, Any]]:
+    """
+    Drop redundant documents from the retrieved context and their sources.
+
+    Args:
+        context: Retrieved context strings containing <Document> blocks
+        sources: Per-retriever lists of source dicts
+        threshold: Containment above which a document is a duplicate (DEDUPE_THRESHOLD by default)
+
+    Returns:
+        The deduplicated context, the matching sources and a dict of statistics
+    """
+    threshold = DEDUPE_THRESHOLD if threshold is None else threshold
+    docs_by_chunk: List[List[_Doc]] = []
+    docs: List[_Doc] = []
+    for chunk_index, chunk in enumerate(context):
+        chunk_docs = []
+        if isinstance(chunk, str):
+            for match in DOCUMENT_PATTERN.finditer(chunk):
+                chunk_docs.append(_Doc(chunk_index, match.group(1).strip(), match.group(2).strip()))
+        docs_by_chunk.append(chunk_docs)
+        docs.extend(chunk_docs)
+
+    _mark_duplicates(docs, threshold)
+
+    unique_context = []
+    for chunk, chunk_docs in zip(context, docs_by_chunk):
+        if not chunk_docs:
+            # Error notices and other non-document context pass through unchanged
+            unique_context.append(chunk)
+            continue
+        blocks = [f'<Document {doc.attrs}>\n{doc.body}\n</Document>' for doc in chunk_docs if doc.kept]
+        if blocks:
+            unique_context.append("\n\n---\n\n".join(blocks))
+
+    kept_urls = {doc.url for doc in docs if doc.kept and doc.url}
+    dropped_urls = {doc.url for doc in docs if not doc.kept and doc.url}
+    unique_sources = _filter_sources(sources, dropped_urls, kept_urls)
+
+    stats = {
+        "documents": len(docs),
+        "dropped": sum(1 for doc in docs if not doc.kept),
+        "bytes_before": sum(len(c.encode("utf-8")) for c in context if isinstance(c, str)),
+        "bytes_after": sum(len(c.encode("utf-8")) for c in unique_context if isinstance(c, str)),
+    }
+    if stats["dropped"]:
+        logger.info(
+            f"Deduplicated context: dropped {stats['dropped']}/{stats['documents']} documents, "
+            f"{stats['bytes_before'] - stats['bytes_after']} bytes"
+        )
+    return unique_context, unique_sources, stats
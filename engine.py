@@ -0,0 +1,203 @@
+"""
+Lazily initialized, process-wide search engine.
+
+Importing web_wiki_search pulls in langchain, langgraph and the provider
+clients and compiles the graphs, which dominates cold-start time. This module
+checks API keys and dependencies without importing any of that, and defers the
+heavy import until the engine is first used (or warmed in the background).
+
+Profile which imports cost the most with:
+
+    python engine.py --profile-imports
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import subprocess
+import sys
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REQUIRED_KEYS = ["GROQ_API_KEY", "TAVILY_API_KEY"]
+REQUIRED_MODULES = ["langchain_groq", "langchain_core", "langchain_community", "langgraph", "wikipedia", "dotenv"]
+
+# Response fields returned to clients; graph-internal state such as raw context is dropped
+RESPONSE_FIELDS = ["question", "answer", "sources", "cached", "coalesced", "degraded", "matched_question",
+                   "route", "sub_queries", "model_route", "draft", "retrieval_status", "timings", "request_id"]
+
+
+def load_credentials() -> None:
+    """ Populate API keys from a .env file and Streamlit secrets without overriding the environment """
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    if "streamlit" not in sys.modules:
+        return
+    try:
+        import streamlit as st
+        for key in REQUIRED_KEYS:
+            if not os.environ.get(key) and key in st.secrets:
+                os.environ[key] = st.secrets[key]
+                logger.info(f"Using {key} from Streamlit secrets")
+    except Exception:
+        # No secrets file configured
+        pass
+
+
+def check_environment() -> List[str]:
+    """
+    Find problems that would stop the engine from loading, without importing it.
+
+    Returns:
+        Human-readable problems; empty when keys and dependencies are present
+    """
+    load_credentials()
+    problems = []
+    for key in REQUIRED_KEYS:
+        if not os.environ.get(key):
+            problems.append(f"{key} not set. Please set it in your environment or .env file")
+    for module in REQUIRED_MODULES:
+        if importlib.util.find_spec(module) is None:
+            problems.append(f"Required package '{module}' is not installed")
+    return problems
+
+
+def answer_text(answer: Any) -> str:
+    """ Plain text of an answer, whether a chat message, a fallback dict or a string """
+    if hasattr(answer, "content"):
+        return answer.content
+    if isinstance(answer, dict):
+        return answer.get("content", "")
+    return str(answer or "")
+
+
+def to_json_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """ Keep the client-facing fields of an engine response, with the answer as plain text """
+    result = {field: response[field] for field in RESPONSE_FIELDS if field in response}
+    if "answer" in result:
+        result["answer"] = answer_text(result["answer"])
+    return result
+
+
+class SearchEngine:
+    """ Facade over web_wiki_search that imports and compiles the pipeline on first use """
+
+    def __init__(self):
+        self._module = None
+        self._error: Optional[Exception] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    @property
+    def error(self) -> Optional[Exception]:
+        return self._error
+
+    def load(self):
+        """ Import the pipeline once; later calls return the already-loaded module """
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            if self._module is None:
+                load_credentials()
+                try:
+                    import web_wiki_search
+                except Exception as e:
+                    self._error = e
+                    logger.error(f"Error loading search engine: {e}")
+                    raise
+                self._module = web_wiki_search
+                self._error = None
+                logger.info("Search engine loaded")
+        return self._module
+
+    def warm(self) -> threading.Thread:
+        """ Load the pipeline on a background thread so the first question does not pay for it """
+        def run():
+            try:
+                self.load()
+            except Exception:
+                pass
+        thread = threading.Thread(target=run, name="engine-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def answer(self, question: str, bypass_cache: bool = False, priority: str = "interactive") -> Dict[str, Any]:
+        return self.load().answer_question(question, bypass_cache=bypass_cache, priority=priority)
+
+    async def aanswer(self, question: str, bypass_cache: bool = False, priority: str = "interactive") -> Dict[str, Any]:
+        return await self.load().aanswer_question(question, bypass_cache=bypass_cache, priority=priority)
+
+    def stream(self, question: str, bypass_cache: bool = False, priority: str = "interactive") -> Iterator[Dict[str, Any]]:
+        return self.load().stream_answer(question, bypass_cache=bypass_cache, priority=priority)
+
+
+_engine: Optional[SearchEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> SearchEngine:
+    """ Return the process-wide engine (created cheaply; the pipeline loads on first use) """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SearchEngine()
+        return _engine
+
+
+def profile_imports(module: str = "web_wiki_search", top: int = 20) -> List[Dict[str, Any]]:
+    """
+    Measure import cost with `python -X importtime` in a fresh interpreter.
+
+    Returns:
+        The `top` most expensive imports by cumulative time, in microseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+        except ValueError:
+            continue
+    if result.returncode != 0:
+        logger.warning(f"Importing {module} failed; timings cover the imports before the failure")
+    return sorted(rows, key=lambda row: row["cumulative_us"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or profile the search engine startup")
+    parser.add_argument("--profile-imports", action="store_true", help="Show the most expensive imports")
+    parser.add_argument("--top", type=int, default=20, help="Number of imports to show")
+    args = parser.parse_args()
+
+    problems = check_environment()
+    for problem in problems:
+        print(f"✗ {problem}")
+    if not problems:
+        print("✓ API keys and dependencies present")
+
+    if args.profile_imports:
+        print(f"\n{'cumulative ms':>14}{'self ms':>10}  module")
+        for row in profile_imports(top=args.top):
+            print(f"{row['cumulative_us'] / 1000:>14.1f}{row['self_us'] / 1000:>10.1f}  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
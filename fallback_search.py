@@ -15,14 +15,31 @@ def invoke(state: Dict[str, Any]) -> Dict[str, Any]:
     Simplified invoke function that returns a static response.
     
     Args:
-        state: Dictionary containing the question
+        state: Dictionary containing the question, and optionally the reason the
+            providers could not be used when they are configured but unavailable
         
     Returns:
         Dictionary with a static answer
     """
     question = state.get('question', '')
+    reason = state.get('reason')
     logger.info(f"Processing question in fallback mode: {question}")
     
+    if reason:
+        # The keys are configured; a provider is down or refusing calls for now
+        return {
+            'answer': {
+                'content': f"""
+# Search Temporarily Unavailable
+
+I couldn't answer your question about "{question}" because a search or language model provider is currently unavailable ({reason}).
+
+This is usually temporary. Please try again in a minute.
+        """
+            },
+            'sources': [[]]
+        }
+    
     answer = {
         'content': f"""
 # API Connection Issue
@@ -0,0 +1,210 @@
+"""
+Offline Wikipedia retriever backed by a local SQLite FTS5 index.
+
+Build an index from a Wikipedia XML dump (optionally bz2-compressed) or from a
+JSONL file with "title" and "text" fields, then point the search graph at it:
+
+    python local_wiki_index.py build enwiki-latest-pages-articles.xml.bz2 --output wiki_index.db
+    python local_wiki_index.py search "What is machine learning?"
+
+    WIKIPEDIA_BACKEND=local LOCAL_WIKI_INDEX_PATH=wiki_index.db streamlit run app.py
+
+Lookups need no network and are served from a memory-mapped database file.
+"""
+
+import argparse
+import bz2
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from passages import tokenize
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LOCAL_WIKI_INDEX_PATH = os.environ.get("LOCAL_WIKI_INDEX_PATH", "wiki_index.db")
+MMAP_SIZE = 1 << 30
+WIKI_URL_PREFIX = "https://en.wikipedia.org/wiki/"
+
+
+def clean_wikitext(text: str) -> str:
+    """ Strip the most common wiki markup so article bodies read as plain text """
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.DOTALL)
+    text = re.sub(r"<ref[^>]*/>", "", text)
+    text = re.sub(r"<ref[^>]*>.*?</ref>", "", text, flags=re.DOTALL)
+    # Templates and tables can nest, so strip innermost first until none remain
+    for pattern in (r"\{\{[^{}]*\}\}", r"\{\|[^{}]*?\|\}"):
+        previous = None
+        while previous != text:
+            previous = text
+            text = re.sub(pattern, "", text, flags=re.DOTALL)
+    text = re.sub(r"\[\[(?:File|Image|Category):[^\]]*\]\]", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"\[\[[^\]|]*\|([^\]]*)\]\]", r"\1", text)
+    text = re.sub(r"\[\[([^\]]*)\]\]", r"\1", text)
+    text = re.sub(r"\[https?://[^\s\]]+\s*([^\]]*)\]", r"\1", text)
+    text = re.sub(r"'{2,}", "", text)
+    text = re.sub(r"<[^>]+>", "", text)
+    text = re.sub(r"^=+\s*(.*?)\s*=+\s*$", r"\1", text, flags=re.MULTILINE)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def iter_dump_articles(path: str) -> Iterator[Tuple[str, str]]:
+    """ Yield (title, wikitext) for main-namespace, non-redirect pages of a MediaWiki XML dump """
+    opener = bz2.open if path.endswith(".bz2") else open
+    with opener(path, "rb") as handle:
+        title, namespace, text, redirect = None, None, None, False
+        for event, elem in ET.iterparse(handle, events=("end",)):
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = elem.text
+            elif tag == "ns":
+                namespace = elem.text
+            elif tag == "redirect":
+                redirect = True
+            elif tag == "text":
+                text = elem.text
+            elif tag == "page":
+                if title and text and namespace == "0" and not redirect:
+                    yield title, text
+                title, namespace, text, redirect = None, None, None, False
+                elem.clear()
+
+
+def iter_jsonl_articles(path: str) -> Iterator[Tuple[str, str]]:
+    """ Yield (title, text) from a JSONL file with one {"title", "text"} object per line """
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("title") and record.get("text"):
+                yield record["title"], record["text"]
+
+
+def build_index(source: str, output: str = LOCAL_WIKI_INDEX_PATH, limit: Optional[int] = None,
+                max_chars: int = 20000) -> int:
+    """
+    Build an FTS5 index from a Wikipedia dump or JSONL file.
+
+    Args:
+        source: Path to a .xml/.xml.bz2 dump or a .jsonl file
+        output: Path of the SQLite index to create (replaced if it exists)
+        limit: Stop after this many articles
+        max_chars: Truncate article bodies to this many characters
+
+    Returns:
+        Number of articles indexed
+    """
+    start_time = time.time()
+    if os.path.exists(output):
+        os.remove(output)
+
+    is_jsonl = source.endswith(".jsonl")
+    articles = iter_jsonl_articles(source) if is_jsonl else iter_dump_articles(source)
+
+    conn = sqlite3.connect(output)
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE articles USING fts5("
+            "title, url UNINDEXED, body, tokenize='porter unicode61')"
+        )
+        count = 0
+        batch = []
+        for title, text in articles:
+            body = text if is_jsonl else clean_wikitext(text)
+            if not body:
+                continue
+            url = WIKI_URL_PREFIX + title.replace(" ", "_")
+            batch.append((title, url, body[:max_chars]))
+            count += 1
+            if len(batch) >= 1000:
+                conn.executemany("INSERT INTO articles (title, url, body) VALUES (?, ?, ?)", batch)
+                conn.commit()
+                batch = []
+                logger.info(f"Indexed {count} articles")
+            if limit and count >= limit:
+                break
+        if batch:
+            conn.executemany("INSERT INTO articles (title, url, body) VALUES (?, ?, ?)", batch)
+        conn.execute("INSERT INTO articles (articles) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    logger.info(f"Built local Wikipedia index with {count} articles in {time.time() - start_time:.2f} seconds")
+    return count
+
+
+class LocalWikipediaIndex:
+    """ Read-only, memory-mapped view of an index built by build_index """
+
+    def __init__(self, path: str = LOCAL_WIKI_INDEX_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Local Wikipedia index not found at {path}")
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+
+    def search(self, query: str, k: int = 2) -> List[Dict[str, Any]]:
+        """ Return up to k articles as dicts with title, url and content, best match first """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        rows = self._conn.execute(
+            "SELECT title, url, body FROM articles WHERE articles MATCH ? "
+            "ORDER BY bm25(articles, 10.0, 0.0, 1.0) LIMIT ?",
+            (match, k),
+        ).fetchall()
+        return [{"title": title, "url": url, "content": body} for title, url, body in rows]
+
+
+_local_index: Optional[LocalWikipediaIndex] = None
+
+
+def get_local_index() -> LocalWikipediaIndex:
+    """ Return the process-wide local index, opening it on first use """
+    global _local_index
+    if _local_index is None:
+        _local_index = LocalWikipediaIndex()
+    return _local_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the offline Wikipedia index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build an index from a dump or JSONL file")
+    build_parser.add_argument("source", help="Wikipedia .xml/.xml.bz2 dump or .jsonl file")
+    build_parser.add_argument("--output", default=LOCAL_WIKI_INDEX_PATH, help="Index file to write")
+    build_parser.add_argument("--limit", type=int, default=None, help="Maximum number of articles")
+    build_parser.add_argument("--max-chars", type=int, default=20000, help="Maximum characters per article")
+
+    search_parser = subparsers.add_parser("search", help="Query an existing index")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--index", default=LOCAL_WIKI_INDEX_PATH, help="Index file to read")
+    search_parser.add_argument("-k", type=int, default=2, help="Number of articles to return")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_index(args.source, args.output, args.limit, args.max_chars)
+    else:
+        start_time = time.time()
+        results = LocalWikipediaIndex(args.index).search(args.query, args.k)
+        print(f"{len(results)} results in {(time.time() - start_time) * 1000:.1f} ms")
+        for result in results:
+            print(f"- {result['title']} ({result['url']})")
+            print(f"  {result['content'][:150]}...")
+
+
+if __name__ == "__main__":
+    main()
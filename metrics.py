@@ -0,0 +1,38 @@
+"""
+Process-wide metrics export.
+
+Combines the tracer's latency histograms with the counters kept by the rate
+limiters, request coalescing, the answer and retrieval caches and the semantic
+cache, for the API's /metrics endpoint and the Streamlit sidebar.
+"""
+
+import logging
+from typing import Any, Dict
+
+import cache
+import rate_limit
+import semantic_cache
+import singleflight
+from tracing import tracer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def export_prometheus(prefix: str = "web_wiki_search") -> str:
+    """ Render every metric of this process in the Prometheus text exposition format """
+    return (tracer.export_prometheus(prefix) + rate_limit.export_prometheus(prefix)
+            + singleflight.export_prometheus(prefix) + cache.export_prometheus(prefix)
+            + semantic_cache.export_prometheus(prefix))
+
+
+def export_json() -> Dict[str, Any]:
+    """ Windowed latency percentiles plus limiter, coalescing and cache counters of this process """
+    return {
+        **tracer.export_json(),
+        "rate_limits": rate_limit.limiter_stats(),
+        "coalescing": singleflight.singleflight_stats(),
+        "caches": cache.cache_stats(),
+        "semantic_cache": semantic_cache.semantic_cache_stats(),
+    }
@@ -0,0 +1,179 @@
+"""
+Context assembly for answer generation.
+
+Retrieved documents are split into passages, ranked against the question with
+a local BM25 scorer and packed into a token budget, so the prompt only carries
+the text most likely to answer the question. Each kept passage stays inside its
+original <Document> wrapper so provenance is preserved.
+"""
+
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000))
+PASSAGE_MAX_WORDS = int(os.environ.get("PASSAGE_MAX_WORDS", 120))
+
+DOCUMENT_PATTERN = re.compile(r"<Document([^>]*)>\n?(.*?)\n?</Document>", re.DOTALL)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "did", "do", "does", "for",
+    "from", "how", "in", "is", "it", "its", "of", "on", "or", "that", "the", "this",
+    "to", "was", "were", "what", "when", "where", "which", "who", "why", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """ Lower-case word tokens with common stopwords removed """
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """ Rough LLM token count (about four characters per token for English) """
+    return max(1, len(text) // 4)
+
+
+class Passage:
+    def __init__(self, doc_index: int, position: int, attrs: str, text: str):
+        self.doc_index = doc_index
+        self.position = position
+        self.attrs = attrs
+        self.text = text
+        self.tokens = tokenize(text)
+        self.score = 0.0
+
+
+def parse_documents(context: List[str]) -> List[Tuple[str, str]]:
+    """ Extract (attributes, body) pairs for every <Document> in the retrieved context strings """
+    documents = []
+    for chunk in context:
+        if not isinstance(chunk, str):
+            continue
+        for match in DOCUMENT_PATTERN.finditer(chunk):
+            documents.append((match.group(1).strip(), match.group(2).strip()))
+    return documents
+
+
+def split_passages(text: str, max_words: int = PASSAGE_MAX_WORDS) -> List[str]:
+    """ Split a document body into paragraph-aligned passages of at most max_words words """
+    passages = []
+    current: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        # Very long paragraphs are cut into fixed-size windows
+        while len(words) > max_words:
+            if current:
+                passages.append(" ".join(current))
+                current = []
+            passages.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        if current and len(current) + len(words) > max_words:
+            passages.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class BM25Scorer:
+    """ Okapi BM25 over a small in-memory corpus of passages """
+
+    def __init__(self, corpus: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_freq: Counter = Counter()
+        for tokens in corpus:
+            self.doc_freq.update(set(tokens))
+        self.size = len(corpus)
+        self.avg_len = sum(len(tokens) for tokens in corpus) / self.size if self.size else 0.0
+
+    def idf(self, term: str) -> float:
+        n = self.doc_freq.get(term, 0)
+        return math.log(1 + (self.size - n + 0.5) / (n + 0.5))
+
+    def score(self, query: List[str], tokens: List[str]) -> float:
+        if not tokens or not self.avg_len:
+            return 0.0
+        counts = Counter(tokens)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_len)
+        total = 0.0
+        for term in set(query):
+            tf = counts.get(term, 0)
+            if tf:
+                total += self.idf(term) * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+
+def assemble_context(question: str, context: List[str],
+                     token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, Dict[str, Any]]:
+    """
+    Select the passages most relevant to the question that fit in the token budget.
+
+    Args:
+        question: The user's question
+        context: Retrieved context strings containing <Document> blocks
+        token_budget: Maximum estimated tokens of passage text to keep
+
+    Returns:
+        The packed context string and a dict of assembly statistics
+    """
+    documents = parse_documents(context)
+    passages = []
+    for doc_index, (attrs, body) in enumerate(documents):
+        for position, text in enumerate(split_passages(body)):
+            passages.append(Passage(doc_index, position, attrs, text))
+
+    query = tokenize(question)
+    scorer = BM25Scorer([p.tokens for p in passages])
+    # Share of the question's terms that appear anywhere in the retrieved text
+    query_terms = set(query)
+    covered = query_terms & set(scorer.doc_freq)
+    coverage = len(covered) / len(query_terms) if query_terms else 1.0
+    for passage in passages:
+        passage.score = scorer.score(query, passage.tokens)
+
+    # Highest score first; ties keep document order so lead paragraphs win
+    ranked = sorted(passages, key=lambda p: (-p.score, p.doc_index, p.position))
+    kept = []
+    used = 0
+    for passage in ranked:
+        cost = estimate_tokens(passage.text)
+        if used + cost > token_budget:
+            continue
+        kept.append(passage)
+        used += cost
+
+    # Re-group kept passages under their original documents, in reading order
+    grouped: Dict[int, List[Passage]] = {}
+    for passage in sorted(kept, key=lambda p: (p.doc_index, p.position)):
+        grouped.setdefault(passage.doc_index, []).append(passage)
+    blocks = []
+    for doc_index, doc_passages in grouped.items():
+        attrs = doc_passages[0].attrs
+        body = "\n\n".join(p.text for p in doc_passages)
+        blocks.append(f'<Document {attrs}>\n{body}\n</Document>')
+
+    total_tokens = sum(estimate_tokens(p.text) for p in passages)
+    stats = {
+        "documents": len(documents),
+        "passages_total": len(passages),
+        "passages_kept": len(kept),
+        "tokens_total": total_tokens,
+        "tokens_kept": used,
+        "top_score": ranked[0].score if ranked else 0.0,
+        "coverage": coverage,
+    }
+    logger.info(
+        f"Context assembled: kept {len(kept)}/{len(passages)} passages from {len(documents)} documents, "
+        f"{used}/{total_tokens} tokens ({total_tokens - used} dropped)"
+    )
+    return "\n\n---\n\n".join(blocks), stats
@@ -0,0 +1,152 @@
+"""
+Process-pool execution backend.
+
+Graph invocations (retrieval formatting, deduplication, passage ranking and
+answer generation) run in a pool of worker processes, so that CPU-bound work
+does not compete with the front end's own threads for the GIL. Every worker
+loads one engine when it starts and keeps it for its lifetime. Blocking calls
+return futures, async callers await them, and streamed events are relayed
+back through a queue shared with the worker.
+
+Caches in memory, rate limiters and request coalescing are per worker
+process; the SQLite caches are shared by all of them.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterator, Optional
+
+from engine import get_engine, to_json_response
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# "thread" runs the engine in the calling process, "process" dispatches to the worker pool
+EXECUTION_BACKEND = os.environ.get("EXECUTION_BACKEND", "thread")
+PROCESS_WORKERS = int(os.environ.get("PROCESS_WORKERS", os.cpu_count() or 2))
+STREAM_EVENT_TIMEOUT = float(os.environ.get("STREAM_EVENT_TIMEOUT", 120))
+
+
+def _init_worker() -> None:
+    """ Load the pipeline once per worker process """
+    get_engine().load()
+    logger.info(f"Process worker {os.getpid()} ready")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _answer_in_worker(question: str, bypass_cache: bool, priority: str) -> Dict[str, Any]:
+    return to_json_response(get_engine().answer(question, bypass_cache=bypass_cache, priority=priority))
+
+
+def _stream_in_worker(question: str, bypass_cache: bool, priority: str, events) -> None:
+    try:
+        for event in get_engine().stream(question, bypass_cache=bypass_cache, priority=priority):
+            if event["type"] == "done":
+                event = {"type": "done", **to_json_response(event)}
+            events.put(event)
+    except Exception as e:
+        logger.error(f"Error streaming in worker {os.getpid()}: {e}")
+        events.put({"type": "error", "error": str(e)})
+    finally:
+        # End-of-stream marker
+        events.put(None)
+
+
+class ProcessBackend:
+    """ Engine-compatible facade that runs every request in a worker process """
+
+    def __init__(self, workers: int = PROCESS_WORKERS):
+        self.workers = workers
+        # Spawned (not forked) workers do not inherit the front end's threads and locks
+        self._context = multiprocessing.get_context("spawn")
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context,
+                                                 initializer=_init_worker)
+                logger.info(f"Started process pool with {self.workers} workers")
+            return self._pool
+
+    def _event_queue(self):
+        with self._lock:
+            if self._manager is None:
+                self._manager = self._context.Manager()
+            return self._manager.Queue()
+
+    def warm(self) -> None:
+        """ Start the workers so each loads its engine before the first request """
+        pool = self._executor()
+        for _ in range(self.workers):
+            pool.submit(_ping)
+
+    def submit(self, question: str, bypass_cache: bool = False, priority: str = "interactive") -> Future:
+        """ Queue a question for a worker and return a future for its JSON-ready response """
+        return self._executor().submit(_answer_in_worker, question, bypass_cache, priority)
+
+    def answer(self, question: str, bypass_cache: bool = False, priority: str = "interactive") -> Dict[str, Any]:
+        return self.submit(question, bypass_cache, priority).result()
+
+    async def aanswer(self, question: str, bypass_cache: bool = False, priority: str = "interactive") -> Dict[str, Any]:
+        return await asyncio.wrap_future(self.submit(question, bypass_cache, priority))
+
+    def stream(self, question: str, bypass_cache: bool = False, priority: str = "interactive") -> Iterator[Dict[str, Any]]:
+        """ Relay a worker's streamed events; yields the same event dicts as SearchEngine.stream """
+        events = self._event_queue()
+        job = self._executor().submit(_stream_in_worker, question, bypass_cache, priority, events)
+        while True:
+            try:
+                event = events.get(timeout=STREAM_EVENT_TIMEOUT)
+            except queue.Empty:
+                job.cancel()
+                raise TimeoutError(f"No stream event within {STREAM_EVENT_TIMEOUT:g}s")
+            if event is None:
+                break
+            if event["type"] == "error":
+                raise RuntimeError(event["error"])
+            yield event
+        # Surface crashes of the worker itself
+        job.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+
+
+_backend: Optional[ProcessBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_process_backend() -> ProcessBackend:
+    """ Return the process-wide worker pool facade """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = ProcessBackend()
+        return _backend
+
+
+def get_backend():
+    """ The engine for EXECUTION_BACKEND: the in-process engine or the worker pool """
+    if EXECUTION_BACKEND == "process":
+        return get_process_backend()
+    if EXECUTION_BACKEND != "thread":
+        raise ValueError(f"Unknown execution backend: {EXECUTION_BACKEND}")
+    return get_engine()
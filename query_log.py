@@ -0,0 +1,251 @@
+"""
+Persistent query log and replay-based load generation.
+
+Every answered question is appended to a compact JSONL log: the question, how
+it was served (cache hit, coalesced or fresh), the route, each node's latency,
+documents and context bytes, and estimated token counts. The log rotates by
+size. The replay command re-runs a captured log against the pipeline, with
+live providers or the offline benchmark stubs, at the recorded pace or
+faster:
+
+    python query_log.py replay queries.jsonl --speed 10 --stub
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from engine import answer_text
+from passages import estimate_tokens
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_ENABLED = os.environ.get("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_PATH = os.environ.get("QUERY_LOG_PATH", "queries.jsonl")
+QUERY_LOG_MAX_BYTES = int(os.environ.get("QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+QUERY_LOG_BACKUPS = int(os.environ.get("QUERY_LOG_BACKUPS", 5))
+
+
+def _token_counts(response: Dict[str, Any]) -> Dict[str, int]:
+    """ Provider-reported token usage when available, otherwise estimates from the packed prompt and answer size """
+    usage = getattr(response.get("answer"), "usage_metadata", None) or {}
+    if usage:
+        return {"prompt": usage.get("input_tokens", 0), "completion": usage.get("output_tokens", 0)}
+    # The answer comes from the last generation span that sent a prompt (a final draft sends none after it)
+    prompts = [timing["prompt_tokens"] for timing in response.get("timings", []) if timing.get("prompt_tokens")]
+    if not prompts:
+        return {"prompt": 0, "completion": 0}
+    return {"prompt": prompts[-1], "completion": estimate_tokens(answer_text(response.get("answer")))}
+
+
+def build_record(question: str, response: Dict[str, Any], elapsed: float, mode: str, cache: str) -> Dict[str, Any]:
+    """
+    Summarize one answered question for the log.
+
+    Args:
+        question: The question as asked
+        response: Response from answer_question, aanswer_question or the final stream event
+        elapsed: Seconds from request to answer
+        mode: "sync", "async" or "stream"
+        cache: "exact", "semantic", "coalesced", "miss" or "bypass"
+
+    Returns:
+        The log record
+    """
+    nodes = {}
+    for timing in response.get("timings", []):
+        # Repeated nodes (an expansion pass) are summed
+        node = nodes.setdefault(timing["node"], {"seconds": 0.0, "documents": 0, "bytes": 0, "status": "ok"})
+        node["seconds"] = round(node["seconds"] + timing["seconds"], 3)
+        node["documents"] += timing.get("documents", 0)
+        node["bytes"] += timing.get("context_bytes", 0)
+        if timing.get("status") != "ok":
+            node["status"] = timing.get("status")
+    record = {
+        "ts": round(time.time() - elapsed, 3),
+        "question": question,
+        "request_id": response.get("request_id"),
+        "mode": mode,
+        "cache": cache,
+        "route": (response.get("route") or {}).get("route"),
+        "elapsed": round(elapsed, 3),
+        "nodes": nodes,
+        "tokens": _token_counts(response),
+    }
+    if response.get("sub_queries"):
+        record["sub_queries"] = len(response["sub_queries"])
+    if response.get("model_route"):
+        record["model"] = response["model_route"]["model"]
+    if (response.get("draft") or {}).get("first_token_seconds") is not None:
+        # Time to the first draft token, when a progressive answer was streamed
+        record["draft_seconds"] = response["draft"]["first_token_seconds"]
+    if response.get("degraded"):
+        record["degraded"] = True
+    return record
+
+
+class QueryLog:
+    """ Append-only JSONL file rotated by size (queries.jsonl, queries.jsonl.1, ...) """
+
+    def __init__(self, path: str = QUERY_LOG_PATH, max_bytes: int = QUERY_LOG_MAX_BYTES,
+                 backups: int = QUERY_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                if os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+            except FileNotFoundError:
+                pass
+            # One write per line on an O_APPEND descriptor keeps lines whole across processes
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+
+_query_log: Optional[QueryLog] = None
+_query_log_lock = threading.Lock()
+
+
+def get_query_log() -> Optional[QueryLog]:
+    """ Return the process-wide query log, or None when disabled """
+    global _query_log
+    if not QUERY_LOG_ENABLED:
+        return None
+    with _query_log_lock:
+        if _query_log is None:
+            _query_log = QueryLog()
+        return _query_log
+
+
+def iter_log(path: str, include_rotated: bool = False) -> Iterator[Dict[str, Any]]:
+    """ Read log records oldest first, optionally starting with the rotated files """
+    paths = [path]
+    if include_rotated:
+        index = 1
+        while os.path.exists(f"{path}.{index}"):
+            paths.insert(0, f"{path}.{index}")
+            index += 1
+    for log_path in paths:
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed line in {log_path}")
+
+
+async def replay(records: List[Dict[str, Any]], module, speed: float = 1.0, concurrency: int = 64,
+                 bypass_cache: bool = False) -> List[Dict[str, Any]]:
+    """
+    Re-issue logged questions at their recorded offsets divided by speed.
+
+    Args:
+        records: Log records, oldest first
+        module: web_wiki_search, live or with stub providers installed
+        speed: Time compression factor; 0 sends every question at once
+        concurrency: Maximum questions in flight
+        bypass_cache: Skip the answer caches so every question runs the graph
+
+    Returns:
+        {"elapsed", "response"} results in the benchmark runner's format
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    first_ts = records[0]["ts"] if records else 0.0
+    started = time.monotonic()
+
+    async def one(record):
+        if speed > 0:
+            await asyncio.sleep(max(0.0, (record["ts"] - first_ts) / speed - (time.monotonic() - started)))
+        async with semaphore:
+            start_time = time.monotonic()
+            try:
+                response = await module.aanswer_question(record["question"], bypass_cache=bypass_cache)
+            except Exception as e:
+                logger.error(f"Error replaying '{record['question']}': {e}")
+                response = {"retrieval_status": [{"node": "request", "status": "error"}]}
+            return {"elapsed": time.monotonic() - start_time, "response": response}
+
+    return await asyncio.gather(*(one(record) for record in records))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay the query log")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = subparsers.add_parser("replay", help="Re-run a captured log against the pipeline")
+    replay_parser.add_argument("log", nargs="?", default=QUERY_LOG_PATH, help="Query log to replay")
+    replay_parser.add_argument("--include-rotated", action="store_true", help="Also replay rotated log files")
+    replay_parser.add_argument("--speed", type=float, default=1.0,
+                               help="Time compression factor (10 replays ten times faster, 0 sends all at once)")
+    replay_parser.add_argument("--concurrency", type=int, default=64, help="Maximum questions in flight")
+    replay_parser.add_argument("--limit", type=int, default=None, help="Replay only the first N records")
+    replay_parser.add_argument("--stub", action="store_true", help="Use the offline benchmark stub providers")
+    replay_parser.add_argument("--bypass-cache", action="store_true", help="Ignore cached answers")
+    replay_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    summary_parser = subparsers.add_parser("summary", help="Show traffic shape statistics for a log")
+    summary_parser.add_argument("log", nargs="?", default=QUERY_LOG_PATH, help="Query log to summarize")
+    summary_parser.add_argument("--include-rotated", action="store_true", help="Include rotated log files")
+    args = parser.parse_args()
+
+    records = list(iter_log(args.log, args.include_rotated))
+    if args.command == "summary":
+        from collections import Counter
+
+        span = records[-1]["ts"] - records[0]["ts"] if len(records) > 1 else 0.0
+        print(f"Records: {len(records)} over {span / 60:.1f} minutes")
+        print(f"Cache outcomes: {dict(Counter(r.get('cache') for r in records))}")
+        print(f"Routes: {dict(Counter(r.get('route') for r in records))}")
+        print(f"Distinct questions: {len({r['question'].lower().strip() for r in records})}")
+        return
+
+    if args.limit:
+        records = records[:args.limit]
+    # Replayed traffic must not feed back into the log being replayed
+    os.environ["QUERY_LOG_ENABLED"] = "false"
+    if args.stub:
+        from benchmark import BackendProfile, install_stubs
+
+        module = install_stubs(BackendProfile(latency=0.8), BackendProfile(latency=1.5, payload_size=20000),
+                               BackendProfile(latency=2.0, payload_size=1200))
+    else:
+        import web_wiki_search as module
+
+    from benchmark import format_report, summarize_results
+
+    start_time = time.time()
+    results = asyncio.run(replay(records, module, args.speed, args.concurrency, args.bypass_cache))
+    report = summarize_results(results, time.time() - start_time)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Process-wide rate limiting for paid providers.
+
+Each provider gets a token bucket refilled at its request-per-minute limit.
+Calls that find the bucket empty queue instead of failing, and queued calls
+are served by priority class (interactive before batch) and then in arrival
+order. Queue depth and wait times are kept for monitoring.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from tracing import LATENCY_BUCKETS, RollingHistogram, render_histogram
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+DEFAULT_PRIORITY = "interactive"
+
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", 60))
+RATE_LIMITS = {
+    "groq": (float(os.environ.get("GROQ_REQUESTS_PER_MINUTE", 30)), int(os.environ.get("GROQ_BURST", 5))),
+    "tavily": (float(os.environ.get("TAVILY_REQUESTS_PER_MINUTE", 100)), int(os.environ.get("TAVILY_BURST", 10))),
+}
+
+
+class RateLimitTimeout(RuntimeError):
+    """ Raised when a call waited longer than the limiter's max_wait for a token """
+
+
+class TokenBucket:
+    """ Token bucket with a priority queue of waiting callers """
+
+    def __init__(self, name: str, requests_per_minute: float, burst: int, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        self.name = name
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self.acquired = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.max_depth = 0
+        self.wait_seconds = RollingHistogram(LATENCY_BUCKETS)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _enqueue(self, priority: str) -> Tuple[int, int]:
+        ticket = (PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY]), next(self._sequence))
+        heapq.heappush(self._waiters, ticket)
+        self.queued += 1
+        self.max_depth = max(self.max_depth, len(self._waiters))
+        return ticket
+
+    def _try_take(self, ticket: Optional[Tuple[int, int]]) -> float:
+        """ Take a token for the caller if it is first in line; otherwise return seconds until the next token """
+        self._refill()
+        first = ticket is None and not self._waiters or self._waiters and self._waiters[0] == ticket
+        if first and self._tokens >= 1:
+            self._tokens -= 1
+            if ticket is not None:
+                heapq.heappop(self._waiters)
+                # Let the next caller in line re-check
+                self._condition.notify_all()
+            return 0.0
+        return max((1 - self._tokens) / self.rate, 0.001)
+
+    def _drop(self, ticket: Tuple[int, int], timed_out: bool = True) -> None:
+        """ Take a caller out of the queue so the ones behind it can move up """
+        if ticket not in self._waiters:
+            return
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        if timed_out:
+            self.timeouts += 1
+        self._condition.notify_all()
+
+    def _granted(self, started: float, priority: str) -> float:
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.wait_seconds.observe(waited)
+        if waited > 1:
+            logger.info(f"{self.name} rate limit: {priority} call waited {waited:.2f}s")
+        return waited
+
+    def acquire(self, priority: str = DEFAULT_PRIORITY, timeout: Optional[float] = None) -> float:
+        """
+        Block until a token is available for this caller.
+
+        Args:
+            priority: Priority class, "interactive" or "batch"
+            timeout: Longest wait, when the caller has less time than max_wait
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.rate <= 0:
+            return 0.0
+        started = time.monotonic()
+        max_wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        with self._condition:
+            if self._try_take(None) == 0:
+                return self._granted(started, priority)
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    delay = self._try_take(ticket)
+                    if delay == 0:
+                        return self._granted(started, priority)
+                    remaining = started + max_wait - time.monotonic()
+                    if remaining <= 0:
+                        self._drop(ticket)
+                        raise RateLimitTimeout(f"{self.name} rate limit: no capacity within {max_wait:g}s")
+                    self._condition.wait(min(delay, remaining))
+            except BaseException:
+                # Interrupted while queued: a ticket left at the head would block everyone behind it
+                self._drop(ticket, timed_out=False)
+                raise
+
+    async def aacquire(self, priority: str = DEFAULT_PRIORITY, timeout: Optional[float] = None) -> float:
+        """ Async variant of acquire that waits without blocking the event loop """
+        if self.rate <= 0:
+            return 0.0
+        started = time.monotonic()
+        max_wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        with self._condition:
+            if self._try_take(None) == 0:
+                return self._granted(started, priority)
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    delay = self._try_take(ticket)
+                    if delay == 0:
+                        return self._granted(started, priority)
+                    remaining = started + max_wait - time.monotonic()
+                    if remaining <= 0:
+                        self._drop(ticket)
+                        raise RateLimitTimeout(f"{self.name} rate limit: no capacity within {max_wait:g}s")
+                # Callers behind the head of the queue poll, since they cannot be notified across threads
+                await asyncio.sleep(min(delay, remaining, 0.05))
+        except BaseException:
+            # A task cancelled while queued (e.g. by a deadline) must give up its place in line
+            with self._condition:
+                self._drop(ticket, timed_out=False)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            depth = len(self._waiters)
+            tokens = self._tokens
+        wait = self.wait_seconds.snapshot()
+        return {
+            "requests_per_minute": self.rate * 60,
+            "tokens": round(tokens, 2),
+            "queue_depth": depth,
+            "max_queue_depth": self.max_depth,
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "timeouts": self.timeouts,
+            "wait_p50": wait["p50"],
+            "wait_p95": wait["p95"],
+        }
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> TokenBucket:
+    """ Return the process-wide limiter for a provider listed in RATE_LIMITS """
+    with _limiters_lock:
+        if provider not in _limiters:
+            requests_per_minute, burst = RATE_LIMITS[provider]
+            _limiters[provider] = TokenBucket(provider, requests_per_minute, burst)
+        return _limiters[provider]
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {provider: get_limiter(provider).stats() for provider in RATE_LIMITS}
+
+
+def export_prometheus(prefix: str = "web_wiki_search") -> str:
+    """ Render queue depth and wait-time metrics in the Prometheus text exposition format """
+    lines = [f"# TYPE {prefix}_rate_limit_queue_depth gauge"]
+    for provider in RATE_LIMITS:
+        lines.append(f'{prefix}_rate_limit_queue_depth{{provider="{provider}"}} {get_limiter(provider).stats()["queue_depth"]}')
+    name = f"{prefix}_rate_limit_wait_seconds"
+    lines.append(f"# TYPE {name} histogram")
+    for provider in RATE_LIMITS:
+        render_histogram(lines, name, f'provider="{provider}"', get_limiter(provider).wait_seconds.totals())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,388 @@
+"""
+Retries, circuit breakers and bulkheads for provider calls.
+
+Transient failures (timeouts, connection errors, 429 and 5xx responses) are
+retried with jittered exponential backoff. Each provider has a circuit breaker
+that opens after repeated failures, so while a provider is down calls fail
+immediately instead of each waiting out its own timeouts and retries. After a
+cool-down one trial call is let through to test whether the provider is back.
+
+Blocking provider calls run in a bounded pool per provider (a bulkhead), so a
+hung provider can only tie up its own workers. A caller that finds every
+worker busy waits for one only as long as its own deadline allows. Calls given
+a deadline stop retrying once it has passed, so abandoned work frees its worker
+soon after the caller gave up. Client libraries that send HTTP requests
+without a timeout can be given one with apply_http_timeout.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from rate_limit import RateLimitTimeout
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 0.5))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 4))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("BREAKER_RESET_TIMEOUT", 30))
+
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+TRANSIENT_NAME_HINTS = ("timeout", "connection", "ratelimit", "internalserver", "serviceunavailable", "overloaded")
+TRANSIENT_MESSAGE_HINTS = ("timed out", "timeout", "temporarily", "rate limit", "too many requests",
+                           "429", "502", "503", "504", "connection reset", "connection aborted")
+
+
+class CircuitOpenError(RuntimeError):
+    """ Raised instead of calling a provider whose circuit breaker is open """
+
+
+class BulkheadFull(RuntimeError):
+    """ Raised when no worker of a provider pool became free within the caller's wait """
+
+
+class DeadlineExceeded(TimeoutError):
+    """ Raised instead of making a provider call after the caller's deadline has passed """
+
+
+def _status_code(error: BaseException) -> int:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else 0
+
+
+def is_transient(error: BaseException) -> bool:
+    """ Whether a failed call is worth retrying """
+    if isinstance(error, (CircuitOpenError, RateLimitTimeout, DeadlineExceeded)):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    status = _status_code(error)
+    if status:
+        return status in TRANSIENT_STATUS_CODES
+    name = error.__class__.__name__.lower()
+    message = str(error).lower()
+    return any(hint in name for hint in TRANSIENT_NAME_HINTS) or any(hint in message for hint in TRANSIENT_MESSAGE_HINTS)
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """ Full-jitter exponential backoff: uniform between zero and base * 2**attempt, capped """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """ Consecutive-failure circuit breaker with closed, open and half-open states """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        # Calls let through to the provider, retries included
+        self.calls = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """ Raise CircuitOpenError unless a call may go to the provider now """
+        with self._lock:
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                self.calls += 1
+                return
+            if self.state == "half_open" and not self._probing:
+                # Exactly one trial call tests the provider
+                self._probing = True
+                self.calls += 1
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} circuit open; failing fast")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"{self.name} circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"{self.name} circuit opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.time()
+                self._probing = False
+
+    def release(self) -> None:
+        """ Give up a trial call that never reached the provider or was abandoned without an outcome """
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected, "calls": self.calls}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """ Return the process-wide circuit breaker for a provider """
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider)
+        return _breakers[provider]
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        providers = list(_breakers)
+    return {provider: get_breaker(provider).stats() for provider in providers}
+
+
+def provider_calls() -> int:
+    """ Provider calls made by this process so far, across all providers """
+    return sum(stats["calls"] for stats in breaker_stats().values())
+
+
+def _record(breaker: CircuitBreaker, error: BaseException) -> None:
+    # Only provider trouble counts against the breaker; an answered request that failed
+    # for another reason (a bad request, a missing article) shows the provider is up
+    if isinstance(error, RateLimitTimeout):
+        breaker.release()
+    elif is_transient(error):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """ Seconds until an absolute time.time() deadline, or None when there is none """
+    return None if deadline is None else max(deadline - time.time(), 0.0)
+
+
+def _check_deadline(provider: str, deadline: Optional[float]) -> None:
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded(f"{provider} call abandoned: deadline passed")
+
+
+def _retry_fits(deadline: Optional[float], delay: float) -> bool:
+    """ Whether a retry after `delay` seconds would start before the deadline """
+    return deadline is None or time.time() + delay < deadline
+
+
+def call_with_retries(provider: str, fn: Callable[..., Any], *args, attempts: int = RETRY_ATTEMPTS,
+                      deadline: Optional[float] = None, **kwargs) -> Any:
+    """
+    Call fn through the provider's circuit breaker, retrying transient failures.
+
+    Args:
+        provider: Name of the provider's circuit breaker
+        fn: The provider call
+        attempts: Maximum number of calls, including the first
+        deadline: time.time() after which no new attempt is started
+
+    Returns:
+        The result of fn
+    """
+    breaker = get_breaker(provider)
+    for attempt in range(attempts):
+        _check_deadline(provider, deadline)
+        breaker.allow()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            _record(breaker, e)
+            delay = backoff_delay(attempt)
+            if attempt + 1 >= attempts or not is_transient(e) or not _retry_fits(deadline, delay):
+                raise
+            logger.warning(f"{provider} call failed ({e}); retry {attempt + 1}/{attempts - 1} in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        except BaseException:
+            # Interrupted or cancelled before an outcome; free the half-open trial for the next caller
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def acall_with_retries(provider: str, fn: Callable[..., Awaitable[Any]], *args,
+                             attempts: int = RETRY_ATTEMPTS, deadline: Optional[float] = None, **kwargs) -> Any:
+    """ Async variant of call_with_retries for coroutine functions """
+    breaker = get_breaker(provider)
+    for attempt in range(attempts):
+        _check_deadline(provider, deadline)
+        breaker.allow()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            _record(breaker, e)
+            delay = backoff_delay(attempt)
+            if attempt + 1 >= attempts or not is_transient(e) or not _retry_fits(deadline, delay):
+                raise
+            logger.warning(f"{provider} call failed ({e}); retry {attempt + 1}/{attempts - 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled before an outcome; free the half-open trial for the next caller
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+
+
+def stream_with_retries(provider: str, factory: Callable[[], Iterator[Any]],
+                        attempts: int = RETRY_ATTEMPTS) -> Iterator[Any]:
+    """ Stream from factory() through the provider's breaker, retrying only failures before the first item """
+    breaker = get_breaker(provider)
+    for attempt in range(attempts):
+        breaker.allow()
+        started = False
+        try:
+            for item in factory():
+                started = True
+                yield item
+        except Exception as e:
+            _record(breaker, e)
+            if started or attempt + 1 >= attempts or not is_transient(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{provider} stream failed ({e}); retry {attempt + 1}/{attempts - 1} in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        except BaseException:
+            # Closed by the consumer or interrupted; free the half-open trial for the next caller
+            breaker.release()
+            raise
+        breaker.record_success()
+        return
+
+
+class Bulkhead:
+    """ Per-provider thread pool whose callers wait a bounded time for a free worker """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"bulkhead-{name}")
+
+    def _release(self, _future: Optional[Future]) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def submit(self, fn: Callable[..., Any], *args, wait: Optional[float] = None, **kwargs) -> Future:
+        """
+        Run fn on a free worker.
+
+        Args:
+            fn: The call to run
+            wait: Seconds to wait for a worker when all are busy; None waits indefinitely
+
+        Returns:
+            The call's future; raises BulkheadFull when no worker became free in time
+        """
+        give_up = None if wait is None else time.monotonic() + wait
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.workers:
+                    remaining = None if give_up is None else give_up - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        raise BulkheadFull(f"{self.name} bulkhead full ({self.workers} calls in flight)")
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {"workers": self.workers, "in_flight": self.in_flight, "waiting": self.waiting,
+                    "rejected": self.rejected}
+
+
+_bulkheads: Dict[str, Bulkhead] = {}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead(name: str, workers: int) -> Bulkhead:
+    """ Return the process-wide bulkhead for a provider, created with `workers` workers on first use """
+    with _bulkheads_lock:
+        if name not in _bulkheads:
+            _bulkheads[name] = Bulkhead(name, workers)
+        return _bulkheads[name]
+
+
+def bulkhead_stats() -> Dict[str, Dict[str, Any]]:
+    with _bulkheads_lock:
+        return {name: bulkhead.stats() for name, bulkhead in _bulkheads.items()}
+
+
+class _TimeoutRequests:
+    """ Stand-in for the requests module that adds a default timeout to every request """
+
+    def __init__(self, requests_module, timeout: float):
+        self._requests = requests_module
+        self._timeout = timeout
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._requests, name)
+
+    def request(self, method: str, url: str, **kwargs) -> Any:
+        kwargs.setdefault("timeout", self._timeout)
+        return self._requests.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> Any:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> Any:
+        return self.request("POST", url, **kwargs)
+
+
+def apply_http_timeout(module, timeout: float) -> None:
+    """
+    Give a client module that calls requests without a timeout a default one.
+
+    Args:
+        module: The client module, which must refer to requests as `module.requests`
+        timeout: Seconds for connecting and for each read
+    """
+    requests_module = getattr(module, "requests", None)
+    if requests_module is None:
+        raise AttributeError(f"{module.__name__} does not use requests")
+    if isinstance(requests_module, _TimeoutRequests):
+        requests_module = requests_module._requests
+    module.requests = _TimeoutRequests(requests_module, timeout)
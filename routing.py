@@ -0,0 +1,111 @@
+"""
+Per-question retriever routing.
+
+A cheap local classifier decides which retrievers a question needs: web search
+for current events, Wikipedia for stable encyclopedic topics, or both when the
+signals are mixed or weak. Only a confident decision backed by more than one
+weak keyword skips a retriever.
+"""
+
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ROUTING_ENABLED = os.environ.get("ROUTING_ENABLED", "true").lower() == "true"
+ROUTING_MIN_CONFIDENCE = float(os.environ.get("ROUTING_MIN_CONFIDENCE", 0.7))
+# Signal weight the winning side needs before a retriever is skipped; one weak keyword is not enough
+ROUTING_MIN_SIGNAL = float(os.environ.get("ROUTING_MIN_SIGNAL", 2.0))
+
+ROUTE_TARGETS = {
+    "web": ["Web_Search"],
+    "wikipedia": ["Wikipedia_Search"],
+    "both": ["Web_Search", "Wikipedia_Search"],
+}
+
+# (pattern, weight) pairs suggesting the answer changes over time
+FRESHNESS_SIGNALS: List[Tuple[str, float]] = [
+    (r"\b(latest|newest|breaking|news|headlines?|upcoming|trending)\b", 2.0),
+    (r"\b(today|tonight|yesterday|tomorrow|this (week|month|year)|right now|currently)\b", 2.0),
+    # "live" and "new" are left out: "where do penguins live", "how do bees make new queens"
+    (r"\b(current|recent|recently|now)\b", 1.0),
+    (r"\b(price|stock|shares?|weather|forecast|score|results?|standings|release date|election)\b", 1.0),
+    (r"\b(who won|who is winning|when is the next|how much (is|does|are))\b", 1.5),
+]
+
+# (pattern, weight) pairs suggesting a stable, encyclopedic answer
+ENCYCLOPEDIC_SIGNALS: List[Tuple[str, float]] = [
+    (r"\b(history|origins?|etymology|biography|definition|define|meaning of)\b", 2.0),
+    (r"\b(who (was|were)|when (was|were|did)|where (was|were)|born|died|founded|invented|discovered)\b", 1.5),
+    (r"^(what|who) (is|are) (a|an|the)?\b", 1.0),
+    (r"\b(explain|describe|overview|theory|concept|principle|species|century|ancient|dynasty|war)\b", 1.0),
+]
+
+
+class RouteDecision:
+    def __init__(self, route: str, confidence: float, reason: str):
+        self.route = route
+        self.confidence = confidence
+        self.reason = reason
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"route": self.route, "confidence": round(self.confidence, 3), "reason": self.reason}
+
+
+def _score(question: str, signals: List[Tuple[str, float]]) -> Tuple[float, List[str]]:
+    score = 0.0
+    matched = []
+    for pattern, weight in signals:
+        match = re.search(pattern, question)
+        if match:
+            score += weight
+            matched.append(match.group(0).strip())
+    return score, matched
+
+
+def _year_signal(question: str) -> float:
+    """ Mentions of this year or last year point at recent events """
+    this_year = time.gmtime().tm_year
+    years = {int(y) for y in re.findall(r"\b(?:19|20)\d{2}\b", question)}
+    return 2.0 if years & {this_year, this_year - 1} else 0.0
+
+
+def classify_question(question: str, min_confidence: float = ROUTING_MIN_CONFIDENCE,
+                      min_signal: float = ROUTING_MIN_SIGNAL) -> RouteDecision:
+    """
+    Decide which retrievers a question needs.
+
+    Args:
+        question: The user's question
+        min_confidence: Confidence below which both retrievers run
+        min_signal: Signal weight on the winning side below which both retrievers run
+
+    Returns:
+        The route ("web", "wikipedia" or "both") with its confidence and the matched signals
+    """
+    text = question.lower().strip()
+    fresh, fresh_matches = _score(text, FRESHNESS_SIGNALS)
+    year = _year_signal(text)
+    if year:
+        fresh += year
+        fresh_matches.append("recent year")
+    encyclopedic, encyclopedic_matches = _score(text, ENCYCLOPEDIC_SIGNALS)
+
+    total = fresh + encyclopedic
+    if not total:
+        return RouteDecision("both", 0.5, "no routing signals")
+
+    # Share of the evidence on the winning side, discounted when the evidence is thin
+    share = max(fresh, encyclopedic) / total
+    strength = min(1.0, max(fresh, encyclopedic) / 2.0)
+    confidence = share * (0.5 + 0.5 * strength)
+    route = "web" if fresh > encyclopedic else "wikipedia"
+    reason = f"freshness: {fresh_matches or 'none'}; encyclopedic: {encyclopedic_matches or 'none'}"
+    if fresh == encyclopedic or confidence < min_confidence or max(fresh, encyclopedic) < min_signal:
+        return RouteDecision("both", confidence, reason)
+    return RouteDecision(route, confidence, reason)
@@ -0,0 +1,212 @@
+"""
+Semantic answer cache for paraphrased questions.
+
+Questions are embedded locally on the CPU with a signed hashing vectorizer
+over word and character-trigram features, so no model download is needed.
+Recent embeddings live in one NumPy matrix and a lookup is a single
+matrix-vector product followed by a cosine threshold check. Questions that
+differ only in a year, a number or a name embed almost identically, so a
+match above the threshold is still vetoed when such a discriminative word
+appears in one question but not the other.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from passages import STOPWORDS, tokenize
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    logger.info("NumPy not installed; semantic cache disabled")
+
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.9))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", 2000))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", os.environ.get("ANSWER_CACHE_TTL", 24 * 60 * 60)))
+
+# Words that frame a question without changing what is being asked
+FRAMING_WORDS = {"explain", "explained", "explanation", "describe", "described", "description", "define",
+                 "defined", "definition", "meaning", "tell", "me", "about", "please", "give", "overview"}
+# Words with their case kept; a contraction such as "what's" counts as its first part
+CASED_WORD_PATTERN = re.compile(r"([A-Za-z0-9]+)(?:['’][A-Za-z]+)?")
+
+
+def _fold(word: str) -> str:
+    # Crude plural folding so "networks" and "network" match
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def content_words(text: str) -> List[str]:
+    """ Question words that carry its meaning: no stopwords or framing words, plurals folded """
+    return [_fold(w) for w in tokenize(text) if w not in FRAMING_WORDS]
+
+
+def key_words(text: str) -> frozenset:
+    """ Words two questions must agree on to share an answer: numbers, capitalized names and short identifiers """
+    keys = set()
+    for position, word in enumerate(CASED_WORD_PATTERN.findall(text)):
+        lower = word.lower()
+        if lower in STOPWORDS or lower in FRAMING_WORDS:
+            continue
+        # The first word is capitalized anyway, unless it is an acronym
+        named = word[0].isupper() and (position > 0 or (len(word) > 1 and word.isupper()))
+        if named or len(word) <= 2 or any(char.isdigit() for char in word):
+            keys.add(_fold(lower))
+    return frozenset(keys)
+
+
+class HashingEmbedder:
+    """ Signed feature hashing of word unigrams, bigrams and character trigrams into a fixed-size vector """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        words = content_words(text)
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            weight = 2.0 if feature.startswith("w:") else 1.0
+            vector[value % self.dim] += weight if (value >> 63) & 1 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """ Fixed-capacity in-memory cache with top-1 cosine lookup and LRU eviction """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL, embedder: Optional[HashingEmbedder] = None):
+        if np is None:
+            raise ImportError("NumPy is required for the semantic cache")
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.embedder = embedder or HashingEmbedder()
+        self._matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        # Content and key words per slot, for the discriminative-word veto
+        self._words: List[frozenset] = [frozenset()] * capacity
+        self._keys: List[frozenset] = [frozenset()] * capacity
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Matches above the threshold vetoed because a key word differed
+        self.rejected = 0
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """ Return the cached entry of the most similar recent question above the threshold that agrees on key words """
+        vector = self.embedder.embed(question)
+        words, keys = frozenset(content_words(question)), key_words(question)
+        now = time.time()
+        with self._lock:
+            if self._size:
+                similarities = self._matrix[:self._size] @ vector
+                # Expired slots never match
+                similarities[now - self._created[:self._size] > self.ttl] = -1.0
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                for slot in candidates[np.argsort(-similarities[candidates])]:
+                    slot, score = int(slot), float(similarities[slot])
+                    differing = [key for key in keys | self._keys[slot] if (key in words) != (key in self._words[slot])]
+                    if differing:
+                        # "...in 2020" and "...in 2024" embed almost identically but need different answers
+                        self.rejected += 1
+                        logger.info(f"Semantic cache near miss ({score:.3f}) for '{question}' -> "
+                                    f"'{self._entries[slot]['question']}': {differing} differ")
+                        continue
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    entry = dict(self._entries[slot])
+                    logger.info(f"Semantic cache hit ({score:.3f}) for '{question}' -> '{entry['question']}'")
+                    return {**entry, "similarity": score}
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str, sources: list) -> None:
+        vector = self.embedder.embed(question)
+        now = time.time()
+        with self._lock:
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                # Reuse an expired slot if there is one, otherwise the least recently used
+                expired = np.flatnonzero(now - self._created > self.ttl)
+                slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+            self._matrix[slot] = vector
+            self._entries[slot] = {"question": question, "answer": answer, "sources": sources}
+            self._words[slot] = frozenset(content_words(question))
+            self._keys[slot] = key_words(question)
+            self._created[slot] = now
+            self._last_used[slot] = now
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """ Return the process-wide semantic cache, or None when disabled or NumPy is missing """
+    global _semantic_cache
+    if not SEMANTIC_CACHE_ENABLED or np is None:
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache()
+        return _semantic_cache
+
+
+def semantic_cache_stats() -> Optional[Dict[str, Any]]:
+    """ Stats of the process-wide semantic cache, or None if it has not been created """
+    cache = _semantic_cache
+    return cache.stats() if cache is not None else None
+
+
+def export_prometheus(prefix: str = "web_wiki_search") -> str:
+    """ Render semantic cache lookups and size in the Prometheus text exposition format """
+    stats = semantic_cache_stats()
+    if stats is None:
+        return ""
+    lines = []
+    for metric, key, kind in (("semantic_cache_hits_total", "hits", "counter"),
+                              ("semantic_cache_misses_total", "misses", "counter"),
+                              ("semantic_cache_rejected_total", "rejected", "counter"),
+                              ("semantic_cache_entries", "entries", "gauge")):
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        lines.append(f"{prefix}_{metric} {stats[key]}")
+    return "\n".join(lines) + "\n"
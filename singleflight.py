@@ -0,0 +1,204 @@
+"""
+Request coalescing for identical in-flight questions.
+
+The first caller for a key runs the work; callers that arrive with the same key
+while it is still running wait for and share its result instead of starting
+their own execution. Supports blocking calls, coroutines and event streams.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class _SharedStream:
+    """ Event log produced once and replayed to every subscriber, including late joiners """
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.condition = threading.Condition()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def close(self) -> None:
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    def subscribe(self) -> Iterator[Dict[str, Any]]:
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.events) and not self.done:
+                    self.condition.wait()
+                if index >= len(self.events):
+                    return
+                event = self.events[index]
+            index += 1
+            if event.get("type") == "error":
+                raise RuntimeError(event["error"])
+            yield event
+
+
+_instances: List["SingleFlight"] = []
+_instances_lock = threading.Lock()
+
+
+class SingleFlight:
+    """ Deduplicates concurrent executions that share a key """
+
+    def __init__(self, name: str = "requests"):
+        self.name = name
+        self.executions = 0
+        self.coalesced = 0
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self._lock = threading.Lock()
+        with _instances_lock:
+            _instances.append(self)
+
+    def _count(self, leader: bool, key: str) -> None:
+        if leader:
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced {self.name} call for: {key}")
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once per key among concurrent callers.
+
+        Returns:
+            The result and whether it was shared from another caller's execution
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._count(leader, key)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """ Coroutine variant of do; callers must share one event loop """
+        with self._lock:
+            future = self._async_calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+            self._count(leader, key)
+
+        if not leader:
+            # Shield so one follower being cancelled does not cancel the shared result
+            return await asyncio.shield(future), True
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+    def stream(self, key: str, factory: Callable[[], Iterator[Dict[str, Any]]]) -> Tuple[Iterator[Dict[str, Any]], bool]:
+        """
+        Share one event stream among concurrent callers.
+
+        The stream is produced on a background thread so it completes for every
+        subscriber even if the caller that started it stops reading.
+
+        Returns:
+            An iterator over the events and whether it was shared
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = _SharedStream()
+            self._count(leader, key)
+
+        if leader:
+            def produce():
+                try:
+                    for event in factory():
+                        shared.publish(event)
+                except Exception as e:
+                    logger.error(f"Error in shared {self.name} stream: {e}")
+                    shared.publish({"type": "error", "error": str(e)})
+                finally:
+                    with self._lock:
+                        del self._streams[key]
+                    shared.close()
+
+            threading.Thread(target=produce, name=f"singleflight-{self.name}", daemon=True).start()
+
+        return shared.subscribe(), not leader
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.executions + self.coalesced
+        with self._lock:
+            in_flight = len(self._calls) + len(self._async_calls) + len(self._streams)
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / calls if calls else 0.0,
+            "in_flight": in_flight,
+        }
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """ Coalescing stats of every SingleFlight created in this process, by name """
+    with _instances_lock:
+        instances = list(_instances)
+    return {instance.name: instance.stats() for instance in instances}
+
+
+def export_prometheus(prefix: str = "web_wiki_search") -> str:
+    """ Render execution and coalescing counters in the Prometheus text exposition format """
+    stats = singleflight_stats()
+    lines: List[str] = []
+    for metric, key, kind in (("singleflight_executions_total", "executions", "counter"),
+                              ("singleflight_coalesced_total", "coalesced", "counter"),
+                              ("singleflight_in_flight", "in_flight", "gauge")):
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, values in stats.items():
+            lines.append(f'{prefix}_{metric}{{name="{name}"}} {values[key]}')
+    return "\n".join(lines) + "\n"
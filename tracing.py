@@ -0,0 +1,215 @@
+"""
+Request tracing and latency metrics for the search pipeline.
+
+Every graph invocation gets a request id and every node records a span with
+its queue wait, provider latency, documents returned and context bytes. Spans
+feed rolling histograms: the JSON export reports percentiles over the recent
+window, while the Prometheus export uses lifetime cumulative counts so that
+buckets never decrease between scrapes.
+"""
+
+import bisect
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0]
+COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20]
+BYTES_BUCKETS = [1_000, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000]
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class Span:
+    """ Timing and payload measurements for one node of one request """
+
+    def __init__(self, request_id: str, node: str):
+        self.request_id = request_id
+        self.node = node
+        self.start = time.time()
+        self.duration = 0.0
+        self.queue_wait = 0.0
+        self.provider_latency = 0.0
+        self.documents = 0
+        self.context_bytes = 0
+        # Estimated tokens of the prompt a generation node sent, after passage packing
+        self.prompt_tokens = 0
+        self.status = "ok"
+
+    def record_update(self, update: Dict[str, Any]) -> None:
+        """ Count documents and context bytes in a node's state update """
+        self.documents = sum(len(source_list) for source_list in update.get("sources", []))
+        self.context_bytes = sum(len(c.encode("utf-8")) for c in update.get("context", []) if isinstance(c, str))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "node": self.node,
+            "seconds": round(self.duration, 3),
+            "queue_wait": round(self.queue_wait, 3),
+            "provider_latency": round(self.provider_latency, 3),
+            "documents": self.documents,
+            "context_bytes": self.context_bytes,
+            "prompt_tokens": self.prompt_tokens,
+            "status": self.status,
+        }
+
+
+class RollingHistogram:
+    """ Histogram over the observations of the last `window` seconds, plus lifetime totals """
+
+    def __init__(self, buckets: List[float], window: float = 300.0, max_samples: int = 10000):
+        self.buckets = buckets
+        self.window = window
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+        self._total_buckets = [0] * len(buckets)
+        self._total_sum = 0.0
+        self._total_count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._samples.append((time.time(), value))
+            index = bisect.bisect_left(self.buckets, value)
+            for position in range(index, len(self.buckets)):
+                self._total_buckets[position] += 1
+            self._total_sum += value
+            self._total_count += 1
+
+    def totals(self) -> Dict[str, Any]:
+        """ Cumulative count, sum and bucket counts since the process started """
+        with self._lock:
+            return {
+                "count": self._total_count,
+                "sum": self._total_sum,
+                "buckets": list(zip(self.buckets, self._total_buckets)),
+            }
+
+    def values(self) -> List[float]:
+        cutoff = time.time() - self.window
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return [value for _, value in self._samples]
+
+    def snapshot(self) -> Dict[str, Any]:
+        values = sorted(self.values())
+        counts = [bisect.bisect_right(values, bound) for bound in self.buckets]
+
+        def quantile(q: float) -> float:
+            return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+        return {
+            "count": len(values),
+            "sum": sum(values),
+            "buckets": list(zip(self.buckets, counts)),
+            "p50": quantile(0.50),
+            "p95": quantile(0.95),
+            "p99": quantile(0.99),
+        }
+
+
+def render_histogram(lines: List[str], name: str, labels: str, totals: Dict[str, Any]) -> None:
+    """ Append one histogram series in the Prometheus text exposition format
+
+    Args:
+        lines: Output lines to append to
+        name: Metric name
+        labels: Label pairs without braces, e.g. 'node="Web_Search"', or ""
+        totals: Cumulative counts as returned by RollingHistogram.totals()
+    """
+    separator = "," if labels else ""
+    for bound, count in totals["buckets"]:
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}')
+    lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {totals["count"]}')
+    label_set = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{label_set} {totals['sum']}")
+    lines.append(f"{name}_count{label_set} {totals['count']}")
+
+
+class Tracer:
+    """ Process-wide sink for spans and request latencies """
+
+    METRICS = {
+        "node_latency_seconds": ("duration", LATENCY_BUCKETS),
+        "node_queue_wait_seconds": ("queue_wait", LATENCY_BUCKETS),
+        "node_provider_latency_seconds": ("provider_latency", LATENCY_BUCKETS),
+        "node_documents": ("documents", COUNT_BUCKETS),
+        "node_context_bytes": ("context_bytes", BYTES_BUCKETS),
+    }
+
+    def __init__(self, window: float = 300.0, recent: int = 500):
+        self.window = window
+        self._histograms: Dict[Tuple[str, str], RollingHistogram] = {}
+        self._requests = RollingHistogram(LATENCY_BUCKETS, window)
+        self._lock = threading.Lock()
+        self.recent_spans: Deque[Dict[str, Any]] = deque(maxlen=recent)
+
+    def _histogram(self, metric: str, node: str) -> RollingHistogram:
+        with self._lock:
+            key = (metric, node)
+            if key not in self._histograms:
+                self._histograms[key] = RollingHistogram(self.METRICS[metric][1], self.window)
+            return self._histograms[key]
+
+    def start_span(self, request_id: Optional[str], node: str) -> Span:
+        return Span(request_id or "untracked", node)
+
+    def end_span(self, span: Span) -> Dict[str, Any]:
+        """ Close a span, feed its histograms and return it as a dict """
+        span.duration = time.time() - span.start
+        for metric, (attribute, _) in self.METRICS.items():
+            self._histogram(metric, span.node).observe(getattr(span, attribute))
+        record = span.to_dict()
+        self.recent_spans.append(record)
+        logger.info(
+            f"[{span.request_id}] {span.node} {span.status} in {span.duration:.2f}s "
+            f"(queue {span.queue_wait:.2f}s, provider {span.provider_latency:.2f}s, "
+            f"{span.documents} docs, {span.context_bytes} bytes)"
+        )
+        return record
+
+    def record_request(self, request_id: str, seconds: float) -> None:
+        self._requests.observe(seconds)
+        logger.info(f"[{request_id}] Request finished in {seconds:.2f}s")
+
+    def export_json(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self._histograms)
+        nodes: Dict[str, Dict[str, Any]] = {}
+        for metric, node in keys:
+            snapshot = self._histogram(metric, node).snapshot()
+            snapshot.pop("buckets")
+            nodes.setdefault(node, {})[metric] = snapshot
+        request = self._requests.snapshot()
+        request.pop("buckets")
+        return {"window_seconds": self.window, "request_latency_seconds": request, "nodes": nodes}
+
+    def export_prometheus(self, prefix: str = "web_wiki_search") -> str:
+        """ Render all histograms in the Prometheus text exposition format, cumulative since startup """
+        lines: List[str] = []
+        name = f"{prefix}_request_latency_seconds"
+        lines.append(f"# TYPE {name} histogram")
+        render_histogram(lines, name, "", self._requests.totals())
+
+        with self._lock:
+            keys = sorted(self._histograms)
+        for metric in self.METRICS:
+            name = f"{prefix}_{metric}"
+            lines.append(f"# TYPE {name} histogram")
+            for key_metric, node in keys:
+                if key_metric == metric:
+                    render_histogram(lines, name, f'node="{node}"', self._histogram(metric, node).totals())
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
@@ -3,14 +3,36 @@ try:
     from langchain_core.messages import HumanMessage, SystemMessage
     from langchain_community.document_loaders import WikipediaLoader
     from langchain_community.tools import TavilySearchResults
+    from langchain_core.documents import Document
     from langgraph.graph import START, END, StateGraph
     from typing_extensions import TypedDict
-    from typing import Annotated, List, Dict, Any, Optional
+    from typing import Annotated, List, Dict, Any, Iterator, Optional, Tuple
     import operator
+    import asyncio
+    import queue
+    import threading
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
     import logging
     import time
     import os
     from dotenv import load_dotenv
+    from cache import get_answer_cache, get_retrieval_cache, normalize_question
+    from passages import assemble_context, estimate_tokens, parse_documents
+    from dedupe import dedupe_context
+    from routing import ROUTE_TARGETS, ROUTING_ENABLED, classify_question
+    from decompose import DECOMPOSE_CONCURRENCY, DECOMPOSE_ENABLED, DECOMPOSE_MAX_SUBQUERIES, decompose_question
+    from rate_limit import DEFAULT_PRIORITY, get_limiter
+    from resilience import (BulkheadFull, CircuitOpenError, acall_with_retries, apply_http_timeout, call_with_retries,
+                            get_bulkhead, stream_with_retries, time_left)
+    import fallback_search
+    from query_log import build_record, get_query_log
+    from cascade import CASCADE_ENABLED, CASCADE_LARGE_MODEL, CASCADE_SMALL_MODEL, assess_draft, routing_report
+    from local_wiki_index import get_local_index
+    from tracing import new_request_id, tracer
+    from singleflight import SingleFlight
+    from semantic_cache import get_semantic_cache
+    from wikipedia_tiers import (WIKIPEDIA_MODE, answer_reports_insufficient, context_insufficient,
+                                 fetch_sections, fetch_summaries, wikipedia_titles)
     load_dotenv()
 except ImportError as e:
     import logging
@@ -21,15 +43,6 @@ except ImportError as e:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Check for API keys
-if not os.environ.get("GROQ_API_KEY"):
-    logger.error("GROQ_API_KEY not found in environment variables")
-    raise ValueError("GROQ_API_KEY not set. Please set it in your environment or .env file")
-
-if not os.environ.get("TAVILY_API_KEY"):
-    logger.error("TAVILY_API_KEY not found in environment variables")
-    raise ValueError("TAVILY_API_KEY not set. Please set it in your environment or .env file")
-
 # Try to access Streamlit secrets if running in Streamlit Cloud
 try:
     import streamlit as st
@@ -45,14 +58,63 @@ try:
 except ImportError:
     logger.info("Not running in Streamlit environment")
 
+# Check for API keys
+if not os.environ.get("GROQ_API_KEY"):
+    logger.error("GROQ_API_KEY not found in environment variables")
+    raise ValueError("GROQ_API_KEY not set. Please set it in your environment or .env file")
+
+if not os.environ.get("TAVILY_API_KEY"):
+    logger.error("TAVILY_API_KEY not found in environment variables")
+    raise ValueError("TAVILY_API_KEY not set. Please set it in your environment or .env file")
+
+# "live" fetches articles through WikipediaLoader, "local" reads the offline index built by local_wiki_index.py
+WIKIPEDIA_BACKEND = os.environ.get("WIKIPEDIA_BACKEND", "live")
+
+# Latency budget per request and per retriever, in seconds. Retrievers must finish early
+# enough to leave GENERATION_RESERVE seconds of the request budget for the answer.
+REQUEST_LATENCY_BUDGET = float(os.environ.get("REQUEST_LATENCY_BUDGET", 15))
+GENERATION_RESERVE = float(os.environ.get("GENERATION_RESERVE", 5))
+NODE_TIMEOUTS = {
+    "Web_Search": float(os.environ.get("WEB_SEARCH_TIMEOUT", 6)),
+    "Wikipedia_Search": float(os.environ.get("WIKIPEDIA_SEARCH_TIMEOUT", 6)),
+}
+# Workers in each retriever's own pool. A request holds one per retriever, or up to DECOMPOSE_CONCURRENCY
+# for a compound question, so the default covers the API server's concurrent requests (API_MAX_CONCURRENCY)
+# all asking compound questions; callers that find every worker busy wait until their node's deadline
+RETRIEVAL_WORKERS = int(os.environ.get(
+    "RETRIEVAL_WORKERS",
+    int(os.environ.get("API_MAX_CONCURRENCY", 16)) * min(DECOMPOSE_CONCURRENCY, DECOMPOSE_MAX_SUBQUERIES + 1)))
+# HTTP timeouts for provider clients that set none themselves, and for Groq. An attempt still running
+# at a retriever's deadline ends at most this long afterwards, so it defaults to the longest node timeout
+PROVIDER_HTTP_TIMEOUT = float(os.environ.get("PROVIDER_HTTP_TIMEOUT", max(NODE_TIMEOUTS.values())))
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", 30))
+
+# Streamed answers start with a draft from the first retriever to return, then the answer from all of them
+PROGRESSIVE_ANSWERS = os.environ.get("PROGRESSIVE_ANSWERS", "true").lower() == "true"
+# Seconds without another update before a draft starts, so retrievers finishing together (both answered
+# from the retrieval cache, say) go straight to the full answer
+PROGRESSIVE_DRAFT_GRACE = float(os.environ.get("PROGRESSIVE_DRAFT_GRACE", 0.05))
+
 # Initialize LLM with error handling
 try:
-    llm = ChatGroq(model="llama-3.3-70b-versatile")
+    llm = ChatGroq(model=CASCADE_LARGE_MODEL, timeout=LLM_REQUEST_TIMEOUT)
+    # Answers first, escalating to llm when its draft is not grounded in the context
+    small_llm = ChatGroq(model=CASCADE_SMALL_MODEL, timeout=LLM_REQUEST_TIMEOUT) if CASCADE_ENABLED else None
     logger.info("LLM initialized successfully")
 except Exception as e:
     logger.error(f"Error initializing LLM: {e}")
     raise
 
+# The Wikipedia and Tavily clients send requests without a timeout, so a hung provider would
+# hold its retrieval workers until the connection dropped
+try:
+    import wikipedia.wikipedia
+    from langchain_community.utilities import tavily_search
+    apply_http_timeout(wikipedia.wikipedia, PROVIDER_HTTP_TIMEOUT)
+    apply_http_timeout(tavily_search, PROVIDER_HTTP_TIMEOUT)
+except (ImportError, AttributeError) as e:
+    logger.warning(f"Could not set provider HTTP timeouts: {e}")
+
 class Source:
     def __init__(self, title: str, url: Optional[str] = None, content_preview: Optional[str] = None):
         self.title = title
@@ -69,39 +131,123 @@ class Source:
 class State(TypedDict):
     question: str
     answer: str
+    started_at: float
+    deadline: float
     context: Annotated[list, operator.add]
     sources: Annotated[list, operator.add]
+    request_id: str
+    priority: str
+    retrieval_status: Annotated[list, operator.add]
+    timings: Annotated[list, operator.add]
+    needs_expansion: bool
+    wikipedia_expanded: bool
+    degraded: bool
+    model_route: Dict[str, Any]
+    unique_context: list
+    unique_sources: list
+    route: Dict[str, Any]
+    sub_queries: List[str]
+    prompt_tokens: int
+
+
+def initial_state(question: str, latency_budget: float = REQUEST_LATENCY_BUDGET,
+                  priority: str = DEFAULT_PRIORITY) -> Dict[str, Any]:
+    """ Graph input for a question, stamped with a request id, its absolute deadline and rate-limit priority """
+    now = time.time()
+    return {"question": question, "request_id": new_request_id(), "started_at": now, "deadline": now + latency_budget,
+            "priority": priority}
+
+def _cached_retrieval(name: str, question: str) -> Optional[Dict[str, Any]]:
+    """ Return a node update from the named retriever's cache, or None on a miss """
+    try:
+        cached = get_retrieval_cache(name).lookup(question)
+    except Exception as e:
+        logger.error(f"Error reading {name} retrieval cache: {e}")
+        return None
+    if cached is None:
+        return None
+    return {"context": [cached["context"]], "sources": [cached["sources"]]}
+
+
+def _store_retrieval(name: str, question: str, context: str, sources: list) -> None:
+    try:
+        get_retrieval_cache(name).store(question, context, sources)
+    except Exception as e:
+        logger.error(f"Error writing {name} retrieval cache: {e}")
+
+
+def _format_web_results(search_docs: list) -> Tuple[str, list]:
+    """ Turn Tavily results into a context string and a list of source dicts """
+    # Track sources
+    sources = []
+    for doc in search_docs:
+        # Extract domain from URL
+        url = doc.get("url", "")
+        title = doc.get("title", url.split("/")[2] if "/" in url else "Web Source")
+        
+        # Create truncated content preview (first 150 chars)
+        content_preview = doc.get("content", "")[:150] + "..." if doc.get("content") else None
+        
+        sources.append(Source(title=title, url=url, content_preview=content_preview).to_dict())
+    
+    # Format for context
+    formatted_search_docs = "\n\n---\n\n".join(
+        [
+            f'<Document href="{doc["url"]}" title="{doc.get("title", "Web Document")}">\n{doc["content"]}\n</Document>'
+            for doc in search_docs
+        ]
+    )
+    return formatted_search_docs, sources
+
+
+def _format_wikipedia_docs(search_docs: list) -> Tuple[str, list]:
+    """ Turn Wikipedia documents into a context string and a list of source dicts """
+    # Track sources
+    sources = []
+    for doc in search_docs:
+        source_url = doc.metadata.get("source", "")
+        title = source_url.split("/")[-1].replace("_", " ") if source_url else "Wikipedia Article"
+        
+        # Create truncated content preview
+        content_preview = doc.page_content[:150] + "..." if doc.page_content else None
+        
+        sources.append(Source(title=title, url=source_url, content_preview=content_preview).to_dict())
+    
+    # Format for context
+    formatted_search_docs = "\n\n---\n\n".join(
+        [
+            f'<Document source="Wikipedia" title="{doc.metadata.get("source", "").split("/")[-1].replace("_", " ")}" url="{doc.metadata.get("source", "")}">\n{doc.page_content}\n</Document>'
+            for doc in search_docs
+        ]
+    )
+    return formatted_search_docs, sources
+
+
+def _tavily_results(question: str, priority: str, deadline: Optional[float] = None) -> list:
+    get_limiter("tavily").acquire(priority, time_left(deadline))
+    return TavilySearchResults(max_results=3).invoke(question)
+
+
+async def _atavily_results(question: str, priority: str, deadline: Optional[float] = None) -> list:
+    await get_limiter("tavily").aacquire(priority, time_left(deadline))
+    return await TavilySearchResults(max_results=3).ainvoke(question)
+
 
 def search_web(state):
     """ Retrieve docs from web search with enhanced source tracking """
-    start_time = time.time()
     logger.info(f"Initiating web search for: {state['question']}")
     
+    cached = _cached_retrieval("web", state['question'])
+    if cached is not None:
+        return cached
+    
     try:
-        tavily_search = TavilySearchResults(max_results=3)
-        search_docs = tavily_search.invoke(state['question'])
-        
-        # Track sources
-        sources = []
-        for doc in search_docs:
-            # Extract domain from URL
-            url = doc.get("url", "")
-            title = doc.get("title", url.split("/")[2] if "/" in url else "Web Source")
-            
-            # Create truncated content preview (first 150 chars)
-            content_preview = doc.get("content", "")[:150] + "..." if doc.get("content") else None
-            
-            sources.append(Source(title=title, url=url, content_preview=content_preview).to_dict())
-        
-        # Format for context
-        formatted_search_docs = "\n\n---\n\n".join(
-            [
-                f'<Document href="{doc["url"]}" title="{doc.get("title", "Web Document")}">\n{doc["content"]}\n</Document>'
-                for doc in search_docs
-            ]
-        )
-        
-        logger.info(f"Web search completed in {time.time() - start_time:.2f} seconds. Found {len(search_docs)} documents.")
+        search_docs = call_with_retries("tavily", _tavily_results, state['question'],
+                                        state.get("priority", DEFAULT_PRIORITY), state.get("node_deadline"),
+                                        deadline=state.get("node_deadline"))
+        formatted_search_docs, sources = _format_web_results(search_docs)
+        
+        _store_retrieval("web", state['question'], formatted_search_docs, sources)
         return {"context": [formatted_search_docs], "sources": [sources]}
     
     except Exception as e:
@@ -111,33 +257,18 @@ def search_web(state):
 
 def search_wikipedia(state):
     """ Retrieve docs from wikipedia with enhanced source tracking """
-    start_time = time.time()
     logger.info(f"Initiating Wikipedia search for: {state['question']}")
     
+    cached = _cached_retrieval("wikipedia", state['question'])
+    if cached is not None:
+        return cached
+    
     try:
-        search_docs = WikipediaLoader(query=state['question'],
-                                      load_max_docs=2).load()
-        
-        # Track sources
-        sources = []
-        for doc in search_docs:
-            source_url = doc.metadata.get("source", "")
-            title = source_url.split("/")[-1].replace("_", " ") if source_url else "Wikipedia Article"
-            
-            # Create truncated content preview
-            content_preview = doc.page_content[:150] + "..." if doc.page_content else None
-            
-            sources.append(Source(title=title, url=source_url, content_preview=content_preview).to_dict())
-        
-        # Format for context
-        formatted_search_docs = "\n\n---\n\n".join(
-            [
-                f'<Document source="Wikipedia" title="{doc.metadata.get("source", "").split("/")[-1].replace("_", " ")}" url="{doc.metadata.get("source", "")}">\n{doc.page_content}\n</Document>'
-                for doc in search_docs
-            ]
-        )
-        
-        logger.info(f"Wikipedia search completed in {time.time() - start_time:.2f} seconds. Found {len(search_docs)} articles.")
+        loader = WikipediaLoader(query=state['question'], load_max_docs=2)
+        search_docs = call_with_retries("wikipedia", loader.load, deadline=state.get("node_deadline"))
+        formatted_search_docs, sources = _format_wikipedia_docs(search_docs)
+        
+        _store_retrieval("wikipedia", state['question'], formatted_search_docs, sources)
         return {"context": [formatted_search_docs], "sources": [sources]}
     
     except Exception as e:
@@ -145,17 +276,138 @@ def search_wikipedia(state):
         return {"context": ["<Error: Wikipedia search failed>"], "sources": []}
 
 
-def generate_answer(state):
-    """ Node to answer a question with improved prompt engineering """
-    start_time = time.time()
-    logger.info("Generating answer from context")
+def search_local_wikipedia(state):
+    """ Retrieve docs from the offline Wikipedia index, with the same output shape as search_wikipedia """
+    logger.info(f"Initiating local Wikipedia search for: {state['question']}")
     
     try:
-        context = state.get("context", [])
-        question = state.get("question", "")
+        results = get_local_index().search(state['question'], k=2)
+        search_docs = [
+            Document(page_content=result["content"], metadata={"source": result["url"], "title": result["title"]})
+            for result in results
+        ]
+        formatted_search_docs, sources = _format_wikipedia_docs(search_docs)
         
-        # Enhanced prompt template with better instructions
-        answer_template = """
+        return {"context": [formatted_search_docs], "sources": [sources]}
+    
+    except Exception as e:
+        logger.error(f"Error during local Wikipedia search: {e}")
+        return {"context": ["<Error: Wikipedia search failed>"], "sources": []}
+
+
+def _summary_docs(question: str, deadline: Optional[float] = None) -> list:
+    return [
+        Document(page_content=article["content"], metadata={"source": article["url"], "title": article["title"]})
+        for article in call_with_retries("wikipedia", fetch_summaries, question, max_docs=2, deadline=deadline)
+    ]
+
+
+def search_wikipedia_summaries(state):
+    """ Retrieve only the lead sections of the best matching Wikipedia articles """
+    logger.info(f"Initiating Wikipedia summary search for: {state['question']}")
+    
+    cached = _cached_retrieval("wikipedia_summary", state['question'])
+    if cached is not None:
+        return cached
+    
+    try:
+        formatted_search_docs, sources = _format_wikipedia_docs(_summary_docs(state['question'],
+                                                                              state.get("node_deadline")))
+        _store_retrieval("wikipedia_summary", state['question'], formatted_search_docs, sources)
+        return {"context": [formatted_search_docs], "sources": [sources]}
+    
+    except Exception as e:
+        logger.error(f"Error during Wikipedia summary search: {e}")
+        return {"context": ["<Error: Wikipedia search failed>"], "sources": []}
+
+
+def _expanded_docs(titles: list) -> list:
+    docs = []
+    for title in titles[:2]:
+        sections = call_with_retries("wikipedia", fetch_sections, title)
+        if sections:
+            url = "https://en.wikipedia.org/wiki/" + title.replace(" ", "_")
+            docs.append(Document(page_content=sections, metadata={"source": url, "title": title}))
+    return docs
+
+
+def assess_context(state):
+    """ Decide from passage ranking whether the summary-tier context covers the question """
+    _, stats = assemble_context(state.get("question", ""), state.get("context", []))
+    needs_expansion = context_insufficient(stats)
+    if needs_expansion:
+        logger.info(f"Context covers {stats['coverage']:.0%} of the question terms; expanding Wikipedia articles")
+    return {"needs_expansion": needs_expansion}
+
+
+def deduplicate(state):
+    """ Drop documents repeated across retrievers before the answer is generated """
+    unique_context, unique_sources, _ = dedupe_context(state.get("context", []), state.get("sources", []))
+    return {"unique_context": unique_context, "unique_sources": unique_sources}
+
+
+def expand_wikipedia(state):
+    """ Fetch the sections after the lead for the Wikipedia articles already retrieved """
+    titles = wikipedia_titles(state.get("sources", []))
+    logger.info(f"Expanding Wikipedia articles: {titles}")
+    
+    try:
+        # Sources are unchanged: the expanded text belongs to the same articles
+        formatted_search_docs, _ = _format_wikipedia_docs(_expanded_docs(titles))
+        return {"context": [formatted_search_docs], "wikipedia_expanded": True, "needs_expansion": False}
+    
+    except Exception as e:
+        logger.error(f"Error expanding Wikipedia articles: {e}")
+        return {"wikipedia_expanded": True, "needs_expansion": False}
+
+
+async def asearch_web(state):
+    """ Async variant of search_web using Tavily's non-blocking client """
+    logger.info(f"Initiating async web search for: {state['question']}")
+    
+    cached = _cached_retrieval("web", state['question'])
+    if cached is not None:
+        return cached
+    
+    try:
+        search_docs = await acall_with_retries("tavily", _atavily_results, state['question'],
+                                               state.get("priority", DEFAULT_PRIORITY), state.get("node_deadline"),
+                                               deadline=state.get("node_deadline"))
+        formatted_search_docs, sources = _format_web_results(search_docs)
+        
+        _store_retrieval("web", state['question'], formatted_search_docs, sources)
+        return {"context": [formatted_search_docs], "sources": [sources]}
+    
+    except Exception as e:
+        logger.error(f"Error during web search: {e}")
+        return {"context": ["<Error: Web search failed>"], "sources": []}
+
+
+async def asearch_wikipedia(state):
+    """ Async variant of search_wikipedia """
+    logger.info(f"Initiating async Wikipedia search for: {state['question']}")
+    
+    cached = _cached_retrieval("wikipedia", state['question'])
+    if cached is not None:
+        return cached
+    
+    try:
+        # The wikipedia client only has a blocking API, so the load runs off the event loop
+        loader = WikipediaLoader(query=state['question'], load_max_docs=2)
+        search_docs = await asyncio.to_thread(call_with_retries, "wikipedia", loader.load,
+                                              deadline=state.get("node_deadline"))
+        formatted_search_docs, sources = _format_wikipedia_docs(search_docs)
+        
+        _store_retrieval("wikipedia", state['question'], formatted_search_docs, sources)
+        return {"context": [formatted_search_docs], "sources": [sources]}
+    
+    except Exception as e:
+        logger.error(f"Error during Wikipedia search: {e}")
+        return {"context": ["<Error: Wikipedia search failed>"], "sources": []}
+
+
+# Enhanced prompt template with better instructions
+ANSWER_TEMPLATE = """
 You are an AI assistant providing accurate and helpful answers based on the provided context.
         
 QUESTION: {question}
@@ -175,15 +427,126 @@ INSTRUCTIONS:
 
 Your response should be comprehensive yet focused on answering the user's question directly.
 """
-        answer_instructions = answer_template.format(question=question, context=context)
+
+
+def build_answer_messages(question: str, context: list) -> list:
+    """ Build the chat messages used to generate an answer from retrieved context """
+    packed_context, _ = assemble_context(question, context)
+    if not packed_context:
+        # Nothing usable was retrieved; pass the retrievers' error notices through instead
+        packed_context = "\n".join(c for c in context if isinstance(c, str)) or "<No context retrieved>"
+    answer_instructions = ANSWER_TEMPLATE.format(question=question, context=packed_context)
+    return [
+        SystemMessage(content=answer_instructions),
+        HumanMessage(content="Please provide a well-structured answer to this question based only on the provided context.")
+    ]
+
+
+def prompt_tokens(messages: list) -> int:
+    """ Estimated tokens of an answer prompt, i.e. the packed context plus the instructions """
+    return sum(estimate_tokens(message.content) for message in messages)
+
+
+def _retrieval_failed(context: list, retrieval_status: Optional[list] = None) -> bool:
+    """ True when no retriever returned documents because every one that ran failed, timed out or was rejected """
+    if parse_documents(context):
+        return False
+    if any(isinstance(c, str) and c.startswith("<Error") for c in context):
+        return True
+    # Abandoned retrievals leave no error notice, only their status
+    return bool(retrieval_status) and not any(status.get("status") == "ok" for status in retrieval_status)
+
+
+def _degraded_answer(state, reason: str) -> Dict[str, Any]:
+    """ Answer from the fallback module when the providers needed for a real answer are down """
+    logger.warning(f"[{state.get('request_id')}] Degraded answer: {reason}")
+    fallback = fallback_search.invoke({"question": state.get("question", ""), "reason": reason})
+    return {"answer": fallback["answer"], "degraded": True}
+
+
+def _invoke_llm(messages: list, priority: str, model=None):
+    get_limiter("groq").acquire(priority)
+    return (model or llm).invoke(messages)
+
+
+async def _ainvoke_llm(messages: list, priority: str, model=None):
+    await get_limiter("groq").aacquire(priority)
+    return await (model or llm).ainvoke(messages)
+
+
+def _stream_llm(messages: list, priority: str, model=None) -> Iterator:
+    get_limiter("groq").acquire(priority)
+    yield from (model or llm).stream(messages)
+
+
+def _draft_answer(messages: list, priority: str) -> Tuple[Any, Optional[Dict[str, Any]], float]:
+    """ Answer with the small model and grade the draft; a failed draft is simply escalated """
+    started_at = time.time()
+    try:
+        draft = call_with_retries("groq", _invoke_llm, messages, priority, model=small_llm)
+        # The system message carries the packed context the draft must be grounded in
+        return draft, assess_draft(draft.content, messages[0].content), time.time() - started_at
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.warning(f"Small model draft failed ({e}); escalating")
+        return None, None, time.time() - started_at
+
+
+async def _adraft_answer(messages: list, priority: str) -> Tuple[Any, Optional[Dict[str, Any]], float]:
+    """ Async variant of _draft_answer """
+    started_at = time.time()
+    try:
+        draft = await acall_with_retries("groq", _ainvoke_llm, messages, priority, model=small_llm)
+        return draft, assess_draft(draft.content, messages[0].content), time.time() - started_at
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.warning(f"Small model draft failed ({e}); escalating")
+        return None, None, time.time() - started_at
+
+
+def _cascade_answer(messages: list, priority: str) -> Dict[str, Any]:
+    """ Node update from the small model when its draft is grounded, otherwise from the large model """
+    if small_llm is None:
+        return {"answer": call_with_retries("groq", _invoke_llm, messages, priority)}
+    draft, assessment, small_seconds = _draft_answer(messages, priority)
+    if assessment is not None and not assessment["escalate"]:
+        return {"answer": draft, "model_route": routing_report(assessment, small_seconds, None)}
+    started_at = time.time()
+    answer = call_with_retries("groq", _invoke_llm, messages, priority)
+    return {"answer": answer, "model_route": routing_report(assessment, small_seconds, time.time() - started_at)}
+
+
+async def _acascade_answer(messages: list, priority: str) -> Dict[str, Any]:
+    """ Async variant of _cascade_answer """
+    if small_llm is None:
+        return {"answer": await acall_with_retries("groq", _ainvoke_llm, messages, priority)}
+    draft, assessment, small_seconds = await _adraft_answer(messages, priority)
+    if assessment is not None and not assessment["escalate"]:
+        return {"answer": draft, "model_route": routing_report(assessment, small_seconds, None)}
+    started_at = time.time()
+    answer = await acall_with_retries("groq", _ainvoke_llm, messages, priority)
+    return {"answer": answer, "model_route": routing_report(assessment, small_seconds, time.time() - started_at)}
+
+
+def generate_answer(state):
+    """ Node to answer a question with improved prompt engineering """
+    logger.info("Generating answer from context")
+    
+    try:
+        context = state.get("unique_context", state.get("context", []))
+        question = state.get("question", "")
         
-        answer = llm.invoke([
-            SystemMessage(content=answer_instructions),
-            HumanMessage(content="Please provide a well-structured answer to this question based only on the provided context.")
-        ])
+        if _retrieval_failed(context, state.get("retrieval_status", [])):
+            return _degraded_answer(state, "all retrievers failed")
         
-        logger.info(f"Answer generated in {time.time() - start_time:.2f} seconds")
-        return {"answer": answer}
+        messages = build_answer_messages(question, context)
+        return {**_cascade_answer(messages, state.get("priority", DEFAULT_PRIORITY)),
+                "prompt_tokens": prompt_tokens(messages)}
+    
+    except CircuitOpenError as e:
+        return _degraded_answer(state, str(e))
     
     except Exception as e:
         logger.error(f"Error generating answer: {e}")
@@ -191,39 +554,713 @@ Your response should be comprehensive yet focused on answering the user's questi
         return {"answer": error_msg}
 
 
-# Setup graph with error handling
-def create_workflow_graph():
+async def asearch_local_wikipedia(state):
+    """ Async variant of search_local_wikipedia; lookups take milliseconds so they run inline """
+    return search_local_wikipedia(state)
+
+
+async def asearch_wikipedia_summaries(state):
+    """ Async variant of search_wikipedia_summaries """
+    return await asyncio.to_thread(search_wikipedia_summaries, state)
+
+
+async def aexpand_wikipedia(state):
+    """ Async variant of expand_wikipedia """
+    return await asyncio.to_thread(expand_wikipedia, state)
+
+
+async def agenerate_answer(state):
+    """ Async variant of generate_answer """
+    logger.info("Generating answer from context (async)")
+    
     try:
-        builder = StateGraph(State)
+        context = state.get("unique_context", state.get("context", []))
+        question = state.get("question", "")
+        
+        if _retrieval_failed(context, state.get("retrieval_status", [])):
+            return _degraded_answer(state, "all retrievers failed")
+        
+        messages = build_answer_messages(question, context)
+        return {**await _acascade_answer(messages, state.get("priority", DEFAULT_PRIORITY)),
+                "prompt_tokens": prompt_tokens(messages)}
+    
+    except CircuitOpenError as e:
+        return _degraded_answer(state, str(e))
+    
+    except Exception as e:
+        logger.error(f"Error generating answer: {e}")
+        error_msg = f"I apologize, but I encountered an error while processing your question. Error details: {str(e)}"
+        return {"answer": error_msg}
+
+
+def _node_timeout(state, name: str) -> float:
+    """ Seconds the named retriever may run: its own timeout, capped by the request deadline """
+    timeout = NODE_TIMEOUTS[name]
+    deadline = state.get("deadline")
+    if deadline:
+        timeout = min(timeout, deadline - GENERATION_RESERVE - time.time())
+    return max(timeout, 0.0)
+
+
+def _run_timed(node, state, submitted_at: float) -> Tuple[Dict[str, Any], float, float]:
+    """ Run a node in its retriever's pool, returning its update, queue wait and provider latency """
+    started_at = time.time()
+    update = node(state)
+    return update, started_at - submitted_at, time.time() - started_at
+
+
+def _finish_retrieval(span, update: Dict[str, Any], status: Optional[str] = None) -> Dict[str, Any]:
+    """ Close a retriever's span and tag its update with the outcome (derived from error notices unless given) and timing """
+    span.record_update(update)
+    if status is None:
+        failed = any(isinstance(c, str) and c.startswith("<Error") for c in update.get("context", []))
+        status = "error" if failed else "ok"
+    span.status = status
+    timing = tracer.end_span(span)
+    status = {"node": span.node, "status": span.status, "elapsed": timing["seconds"]}
+    return {**update, "retrieval_status": [status], "timings": [timing]}
+
+
+def _abandon_retrieval(span, reason: str) -> Dict[str, Any]:
+    logger.warning(f"[{span.request_id}] {span.node} abandoned ({reason}); answering without it")
+    span.provider_latency = time.time() - span.start
+    # The reason must survive as the status so the partial answer is not cached
+    return _finish_retrieval(span, {"context": [], "sources": []}, status=reason)
+
+
+def with_deadline(name: str, node):
+    """ Wrap a sync retriever node so it returns empty context once its deadline passes """
+    def run(state):
+        span = tracer.start_span(state.get("request_id"), name)
+        timeout = _node_timeout(state, name)
+        if timeout <= 0:
+            return _abandon_retrieval(span, "skipped")
+        # Retrievals run in the retriever's own bounded pool so the node can stop waiting at its
+        # deadline; abandoned calls finish in the background and still populate the retrieval cache.
+        # The node's deadline goes with the call so that retries and rate-limit waits stop at it too.
+        deadline = time.time() + timeout
+        try:
+            future = get_bulkhead(name, RETRIEVAL_WORKERS).submit(
+                _run_timed, node, {**state, "node_deadline": deadline}, time.time(), wait=timeout)
+        except BulkheadFull:
+            return _abandon_retrieval(span, "rejected")
+        try:
+            update, span.queue_wait, span.provider_latency = future.result(timeout=time_left(deadline))
+            return _finish_retrieval(span, update)
+        except FutureTimeoutError:
+            return _abandon_retrieval(span, "timeout")
+    return run
+
+
+def with_async_deadline(name: str, node):
+    """ Wrap an async retriever node so it returns empty context once its deadline passes """
+    async def run(state):
+        span = tracer.start_span(state.get("request_id"), name)
+        timeout = _node_timeout(state, name)
+        if timeout <= 0:
+            return _abandon_retrieval(span, "skipped")
+        # Shield the retrieval so a late result still lands in the retrieval cache
+        task = asyncio.ensure_future(node({**state, "node_deadline": time.time() + timeout}))
+        try:
+            update = await asyncio.wait_for(asyncio.shield(task), timeout)
+            span.provider_latency = time.time() - span.start
+            return _finish_retrieval(span, update)
+        except asyncio.TimeoutError:
+            return _abandon_retrieval(span, "timeout")
+    return run
+
+
+def _record_outcome(span, state, update: Dict[str, Any]) -> Dict[str, Any]:
+    span.provider_latency = time.time() - span.start
+    if "answer" in update:
+        # Generation: measure the context it consumed
+        context = state.get("unique_context", state.get("context", []))
+        span.context_bytes = sum(len(c.encode("utf-8")) for c in context if isinstance(c, str))
+        span.status = "ok" if hasattr(update.get("answer"), "content") else "error"
+        span.prompt_tokens = update.get("prompt_tokens", 0)
+    else:
+        span.record_update(update)
+    return {**update, "timings": [tracer.end_span(span)]}
+
+
+def traced(name: str, node):
+    """ Wrap a sync node so it records a span """
+    def run(state):
+        span = tracer.start_span(state.get("request_id"), name)
+        return _record_outcome(span, state, node(state))
+    return run
+
+
+def traced_async(name: str, node):
+    """ Wrap an async node so it records a span """
+    async def run(state):
+        span = tracer.start_span(state.get("request_id"), name)
+        return _record_outcome(span, state, await node(state))
+    return run
+
+
+def _wikipedia_node(backend: str, mode: str = WIKIPEDIA_MODE, use_async: bool = False):
+    """ Pick the Wikipedia retriever node for the configured backend and mode """
+    if backend == "local":
+        return asearch_local_wikipedia if use_async else search_local_wikipedia
+    if backend != "live":
+        raise ValueError(f"Unknown Wikipedia backend: {backend}")
+    if mode == "summary":
+        return asearch_wikipedia_summaries if use_async else search_wikipedia_summaries
+    return asearch_wikipedia if use_async else search_wikipedia
+
+
+def route_question(state):
+    """ Classify the question to decide which retrievers to run """
+    decision = classify_question(state.get("question", ""))
+    logger.info(f"[{state.get('request_id')}] Routing to {decision.route} "
+                f"(confidence {decision.confidence:.2f}; {decision.reason})")
+    return {"route": decision.to_dict()}
+
+
+def decompose(state):
+    """ Split a compound question into sub-queries that are searched separately """
+    sub_queries = decompose_question(state.get("question", ""))
+    if sub_queries:
+        logger.info(f"[{state.get('request_id')}] Searching {len(sub_queries)} sub-queries: {sub_queries}")
+    return {"sub_queries": sub_queries}
+
+
+def _merge_sub_query_results(results: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """ Combine retriever updates for several sub-queries into one, tagging each status with its sub-query """
+    merged = {"context": [], "sources": [], "retrieval_status": [], "timings": []}
+    for sub_query, update in results:
+        merged["context"].extend(update.get("context", []))
+        merged["sources"].extend(update.get("sources", []))
+        merged["retrieval_status"].extend({**status, "query": sub_query} for status in update.get("retrieval_status", []))
+        merged["timings"].extend(update.get("timings", []))
+    return merged
+
+
+def _sub_query_node(wikipedia_backend: str, wikipedia_mode: str, use_async: bool, routing: bool):
+    """ Node that runs the question and its sub-queries through their retrievers, at most DECOMPOSE_CONCURRENCY at a time """
+    deadline = with_async_deadline if use_async else with_deadline
+    retrievers = {
+        "Web_Search": deadline("Web_Search", asearch_web if use_async else search_web),
+        "Wikipedia_Search": deadline("Wikipedia_Search", _wikipedia_node(wikipedia_backend, wikipedia_mode, use_async)),
+    }
+    
+    def tasks(state) -> List[Tuple[str, str]]:
+        # The whole question is searched too, so a wrong split only adds context instead of replacing it;
+        # each part of a compound question is routed on its own
+        pairs = []
+        for sub_query in [state["question"], *state.get("sub_queries", [])]:
+            route = classify_question(sub_query).route if routing else "both"
+            pairs.extend((sub_query, node) for node in ROUTE_TARGETS[route])
+        return pairs
+    
+    async def arun(state):
+        semaphore = asyncio.Semaphore(DECOMPOSE_CONCURRENCY)
         
-        builder.add_node("Web_Search", search_web)
-        builder.add_node("Wikipedia_Search", search_wikipedia)
-        builder.add_node("Generate_Answer", generate_answer)
+        async def one(sub_query: str, node: str):
+            async with semaphore:
+                return sub_query, await retrievers[node]({**state, "question": sub_query})
         
-        builder.add_edge(START, "Web_Search")
-        builder.add_edge(START, "Wikipedia_Search")
-        builder.add_edge("Web_Search", "Generate_Answer")
-        builder.add_edge("Wikipedia_Search", "Generate_Answer")
-        builder.add_edge("Generate_Answer", END)
+        return _merge_sub_query_results(await asyncio.gather(*(one(q, node) for q, node in tasks(state))))
+    
+    def run(state):
+        with ThreadPoolExecutor(max_workers=DECOMPOSE_CONCURRENCY, thread_name_prefix="sub-query") as pool:
+            futures = [(q, pool.submit(retrievers[node], {**state, "question": q})) for q, node in tasks(state)]
+            return _merge_sub_query_results([(q, future.result()) for q, future in futures])
+    
+    return arun if use_async else run
+
+
+def route_to_retrievers(state) -> List[str]:
+    """ Retriever nodes for the routing decision """
+    return ROUTE_TARGETS[state.get("route", {}).get("route", "both")]
+
+
+def route_after_assessment(state) -> str:
+    """ Expand the Wikipedia articles when the summaries do not cover the question """
+    if state.get("needs_expansion") and wikipedia_titles(state.get("sources", [])):
+        return "Expand_Wikipedia"
+    return "Continue"
+
+
+def route_after_answer(state) -> str:
+    """ Expand once and regenerate when the answer says the summary context was insufficient """
+    answer = state.get("answer")
+    text = answer.content if hasattr(answer, "content") else ""
+    if (not state.get("wikipedia_expanded") and answer_reports_insufficient(text)
+            and wikipedia_titles(state.get("sources", []))):
+        logger.info("Answer reports insufficient context; expanding Wikipedia articles")
+        return "Expand_Wikipedia"
+    return "Continue"
+
+
+def _build_graph(use_async: bool, wikipedia_backend: str, wikipedia_mode: str, generate: bool = True,
+                 routing: bool = ROUTING_ENABLED, decomposition: bool = DECOMPOSE_ENABLED):
+    """
+    Build the search workflow.
+    
+    With routing, Route_Question picks the retrievers to run from START;
+    otherwise both retrievers always run. With decomposition, Decompose_Question
+    comes first and sends compound questions to Sub_Query_Search instead, which
+    searches each part and feeds Deduplicate directly. In summary mode an assessment step follows
+    them and can route through Expand_Wikipedia before the answer (or the end
+    of a retrieval-only graph); the answer step can also request one expansion.
+    Retrieved context always passes through Deduplicate on its way to the answer.
+    """
+    deadline = with_async_deadline if use_async else with_deadline
+    trace = traced_async if use_async else traced
+    tiered = wikipedia_backend == "live" and wikipedia_mode == "summary"
+    
+    builder = StateGraph(State)
+    
+    builder.add_node("Web_Search", deadline("Web_Search", asearch_web if use_async else search_web))
+    builder.add_node("Wikipedia_Search", deadline("Wikipedia_Search", _wikipedia_node(wikipedia_backend, wikipedia_mode, use_async)))
+    entry = ["Route_Question"] if routing else ["Web_Search", "Wikipedia_Search"]
+    if routing:
+        builder.add_node("Route_Question", route_question)
+        builder.add_conditional_edges("Route_Question", route_to_retrievers, ["Web_Search", "Wikipedia_Search"])
+    
+    after_retrieval = "Deduplicate"
+    if decomposition:
+        def route_after_decomposition(state) -> List[str]:
+            return ["Sub_Query_Search"] if state.get("sub_queries") else entry
         
-        return builder.compile()
+        builder.add_node("Decompose_Question", decompose)
+        builder.add_node("Sub_Query_Search", _sub_query_node(wikipedia_backend, wikipedia_mode, use_async, routing))
+        builder.add_edge(START, "Decompose_Question")
+        builder.add_conditional_edges("Decompose_Question", route_after_decomposition, ["Sub_Query_Search", *entry])
+        builder.add_edge("Sub_Query_Search", after_retrieval)
+    else:
+        for node in entry:
+            builder.add_edge(START, node)
+    
+    builder.add_node("Deduplicate", deduplicate)
+    if generate:
+        builder.add_node("Generate_Answer", trace("Generate_Answer", agenerate_answer if use_async else generate_answer))
+        builder.add_edge("Deduplicate", "Generate_Answer")
+    else:
+        builder.add_edge("Deduplicate", END)
+    
+    if tiered:
+        builder.add_node("Assess_Context", assess_context)
+        builder.add_node("Expand_Wikipedia", trace("Expand_Wikipedia", aexpand_wikipedia if use_async else expand_wikipedia))
+        builder.add_edge("Web_Search", "Assess_Context")
+        builder.add_edge("Wikipedia_Search", "Assess_Context")
+        builder.add_conditional_edges("Assess_Context", route_after_assessment,
+                                      {"Expand_Wikipedia": "Expand_Wikipedia", "Continue": after_retrieval})
+        builder.add_edge("Expand_Wikipedia", after_retrieval)
+    else:
+        builder.add_edge("Web_Search", after_retrieval)
+        builder.add_edge("Wikipedia_Search", after_retrieval)
+    
+    if generate:
+        if tiered:
+            builder.add_conditional_edges("Generate_Answer", route_after_answer,
+                                          {"Expand_Wikipedia": "Expand_Wikipedia", "Continue": END})
+        else:
+            builder.add_edge("Generate_Answer", END)
+    
+    return builder.compile()
+
+
+# Setup graph with error handling
+def create_workflow_graph(wikipedia_backend: str = WIKIPEDIA_BACKEND, wikipedia_mode: str = WIKIPEDIA_MODE):
+    try:
+        return _build_graph(False, wikipedia_backend, wikipedia_mode)
     
     except Exception as e:
         logger.error(f"Error creating workflow graph: {e}")
         raise
 
-# Create the graph
+
+def create_retrieval_graph(wikipedia_backend: str = WIKIPEDIA_BACKEND, wikipedia_mode: str = WIKIPEDIA_MODE):
+    """ Graph with only the retrieval nodes, used when the answer is streamed separately """
+    try:
+        return _build_graph(False, wikipedia_backend, wikipedia_mode, generate=False)
+    
+    except Exception as e:
+        logger.error(f"Error creating retrieval graph: {e}")
+        raise
+
+
+def create_async_workflow_graph(wikipedia_backend: str = WIKIPEDIA_BACKEND, wikipedia_mode: str = WIKIPEDIA_MODE):
+    """ Same workflow as create_workflow_graph with async nodes, for use with ainvoke/astream """
+    try:
+        return _build_graph(True, wikipedia_backend, wikipedia_mode)
+    
+    except Exception as e:
+        logger.error(f"Error creating async workflow graph: {e}")
+        raise
+
+# Create the graphs
 graph = create_workflow_graph()
+retrieval_graph = create_retrieval_graph()
+async_graph = create_async_workflow_graph()
+
+# Coalesces concurrent executions of the same normalized question
+inflight = SingleFlight("graph")
+
+
+def _lookup_cached_answer(question: str) -> Optional[Dict[str, Any]]:
+    """ Exact (normalized) match first, then the nearest paraphrase in the semantic cache """
+    try:
+        cached = get_answer_cache().lookup(question)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        logger.error(f"Error reading answer cache: {e}")
+    
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None:
+        return None
+    try:
+        return semantic_cache.lookup(question)
+    except Exception as e:
+        logger.error(f"Error reading semantic cache: {e}")
+        return None
+
+
+def _store_answer(question: str, answer: str, sources: list) -> None:
+    try:
+        get_answer_cache().store(question, answer, sources)
+    except Exception as e:
+        logger.error(f"Error writing answer cache: {e}")
+    
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        try:
+            semantic_cache.store(question, answer, sources)
+        except Exception as e:
+            logger.error(f"Error writing semantic cache: {e}")
+
+
+def _retrieval_complete(retrieval_status: list) -> bool:
+    """ True when no retriever failed or missed its deadline, so the answer is safe to cache """
+    return all(status.get("status") == "ok" for status in retrieval_status)
+
+
+def _cached_response(question: str, cached: Dict[str, Any]) -> Dict[str, Any]:
+    return {"question": question, "answer": cached["answer"], "sources": cached["sources"], "cached": True,
+            "matched_question": cached.get("question")}
+
+
+def _finish_response(question: str, state: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    tracer.record_request(state["request_id"], time.time() - state["started_at"])
+    response["sources"] = response.get("unique_sources", response.get("sources", []))
+    
+    # Only successful generations from complete context are cached; errors come back as plain strings
+    answer = response.get("answer")
+    if hasattr(answer, "content") and _retrieval_complete(response.get("retrieval_status", [])):
+        _store_answer(question, answer.content, response.get("sources", []))
+    
+    response["cached"] = False
+    return response
+
+
+def _invoke_graph(question: str, priority: str) -> Dict[str, Any]:
+    state = initial_state(question, priority=priority)
+    return _finish_response(question, state, graph.invoke(state))
+
+
+async def _ainvoke_graph(question: str, priority: str) -> Dict[str, Any]:
+    state = initial_state(question, priority=priority)
+    return _finish_response(question, state, await async_graph.ainvoke(state))
+
+
+def refresh_answer(question: str, priority: str = "batch") -> Dict[str, Any]:
+    """ Answer a question from fresh retrieval and store it, without reading the cache or writing the query log """
+    response, _ = inflight.do(normalize_question(question), lambda: _invoke_graph(question, priority))
+    return response
+
+
+def _log_query(question: str, response: Dict[str, Any], started_at: float, mode: str,
+               bypass_cache: bool) -> Dict[str, Any]:
+    """ Append the request to the query log and return the response unchanged """
+    query_log = get_query_log()
+    if query_log is None:
+        return response
+    if response.get("cached"):
+        cache = "semantic" if response.get("matched_question") else "exact"
+    elif response.get("coalesced"):
+        cache = "coalesced"
+    else:
+        cache = "bypass" if bypass_cache else "miss"
+    try:
+        query_log.append(build_record(question, response, time.time() - started_at, mode, cache))
+    except Exception as e:
+        logger.error(f"Error writing query log: {e}")
+    return response
+
+
+def answer_question(question: str, bypass_cache: bool = False, priority: str = DEFAULT_PRIORITY) -> Dict[str, Any]:
+    """ Answer a question through the answer cache, invoking the graph on a miss """
+    started_at = time.time()
+    if not bypass_cache:
+        cached = _lookup_cached_answer(question)
+        if cached is not None:
+            return _log_query(question, _cached_response(question, cached), started_at, "sync", bypass_cache)
+    
+    # Identical questions already being answered share that execution
+    response, shared = inflight.do(normalize_question(question), lambda: _invoke_graph(question, priority))
+    response = {**response, "coalesced": True} if shared else response
+    return _log_query(question, response, started_at, "sync", bypass_cache)
+
+
+async def aanswer_question(question: str, bypass_cache: bool = False,
+                           priority: str = DEFAULT_PRIORITY) -> Dict[str, Any]:
+    """ Async variant of answer_question, running the async graph with ainvoke """
+    started_at = time.time()
+    if not bypass_cache:
+        cached = _lookup_cached_answer(question)
+        if cached is not None:
+            return _log_query(question, _cached_response(question, cached), started_at, "async", bypass_cache)
+    
+    response, shared = await inflight.ado(normalize_question(question), lambda: _ainvoke_graph(question, priority))
+    response = {**response, "coalesced": True} if shared else response
+    return _log_query(question, response, started_at, "async", bypass_cache)
+
+
+def stream_answer(question: str, bypass_cache: bool = False,
+                  priority: str = DEFAULT_PRIORITY) -> Iterator[Dict[str, Any]]:
+    """
+    Answer a question incrementally.
+    
+    Yields event dicts: one "sources" event once retrieval finishes, a "token"
+    event per generated chunk, and a final "done" event with the full answer.
+    With PROGRESSIVE_ANSWERS, a "draft_sources" event and "draft_token" events
+    for an answer from the first retriever to return come first.
+    Concurrent streams for the same question share one execution.
+    """
+    started_at = time.time()
+    if not bypass_cache:
+        cached = _lookup_cached_answer(question)
+        if cached is not None:
+            yield {"type": "sources", "sources": cached["sources"]}
+            yield {"type": "token", "content": cached["answer"]}
+            response = _log_query(question, _cached_response(question, cached), started_at, "stream", bypass_cache)
+            yield {"type": "done", **response}
+            return
+    
+    events, shared = inflight.stream(normalize_question(question), lambda: _generate_stream(question, priority))
+    for event in events:
+        if event["type"] == "done":
+            event = {**event, "coalesced": True} if shared else event
+            event = _log_query(question, event, started_at, "stream", bypass_cache)
+        yield event
+
+
+class _BackgroundUpdates:
+    """ Runs the retrieval graph on its own thread so node updates keep arriving while a draft streams """
+
+    def __init__(self, state):
+        self._updates = queue.Queue()
+        # An update taken off the queue by arriving() and not yet iterated
+        self._held = []
+        threading.Thread(target=self._produce, args=(state,), name=f"retrieval-{state['request_id']}",
+                         daemon=True).start()
+
+    def _produce(self, state) -> None:
+        try:
+            for update in retrieval_graph.stream(state, stream_mode="updates"):
+                self._updates.put(update)
+        except Exception as e:
+            self._updates.put(e)
+        finally:
+            self._updates.put(None)
+
+    def arriving(self, grace: float) -> bool:
+        """ Whether another update (or the end of the graph) comes within grace seconds """
+        if not self._held:
+            try:
+                self._held.append(self._updates.get(timeout=grace))
+            except queue.Empty:
+                return False
+        return True
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            update = self._held.pop() if self._held else self._updates.get()
+            if update is None:
+                return
+            if isinstance(update, Exception):
+                raise update
+            yield update
+
+
+def _stream_draft(state, node: str, context: list, sources: list, draft: Dict[str, Any],
+                  stage: str = "partial") -> Iterator[Dict[str, Any]]:
+    """
+    Stream a provisional answer as draft events, filling in draft.
+
+    A "partial" draft answers from one retriever's context while the others are still running;
+    a "cascade" draft is the small model's answer from the full context, shown while it is graded.
+    """
+    span = tracer.start_span(state["request_id"], "Draft_Answer")
+    span.context_bytes = sum(len(c.encode("utf-8")) for c in context if isinstance(c, str))
+    messages = build_answer_messages(state["question"], context)
+    span.prompt_tokens = prompt_tokens(messages)
+    draft.update({"node": node, "model": CASCADE_SMALL_MODEL if small_llm is not None else CASCADE_LARGE_MODEL})
+    logger.info(f"[{state['request_id']}] Streaming {stage} draft answer from {node}")
+    yield {"type": "draft_sources", "node": node, "stage": stage, "sources": sources}
+    
+    parts = []
+    # None until the draft has streamed completely; only a graded draft can stand as the answer
+    draft["assessment"] = None
+    try:
+        for chunk in stream_with_retries("groq", lambda: _stream_llm(messages, state["priority"], small_llm)):
+            if chunk.content:
+                if not parts:
+                    draft["first_token_seconds"] = round(time.time() - state["started_at"], 3)
+                parts.append(chunk.content)
+                yield {"type": "draft_token", "content": chunk.content}
+        # Graded against the context it was written from, like a cascade draft
+        draft["assessment"] = assess_draft("".join(parts), messages[0].content)
+    except Exception as e:
+        # The answer from the full context follows either way
+        logger.warning(f"[{state['request_id']}] Draft answer failed: {e}")
+        span.status = "error"
+    span.provider_latency = time.time() - span.start
+    draft["seconds"] = round(span.provider_latency, 3)
+    draft["timing"] = tracer.end_span(span)
+    draft["answer"] = "".join(parts)
+
+
+def _generate_stream(question: str, priority: str) -> Iterator[Dict[str, Any]]:
+    state = initial_state(question, priority=priority)
+    context, sources, retrieval_status, timings = [], [], [], []
+    route = None
+    sub_queries = []
+    # Retrievers still running; a draft is only worth streaming while at least one is
+    pending = set(ROUTE_TARGETS["both"])
+    draft = {}
+    # The first retriever update with documents, which a draft would be written from
+    candidate = None
+    # Whether documents arrived after the draft started, so the full answer can improve on it
+    refined = False
+    if PROGRESSIVE_ANSWERS:
+        updates = _BackgroundUpdates(state)
+    else:
+        updates = retrieval_graph.stream(state, stream_mode="updates")
+    for update in updates:
+        for node, node_update in update.items():
+            if "route" in node_update:
+                route = node_update["route"]
+                pending = set(ROUTE_TARGETS[route["route"]])
+            sub_queries = node_update.get("sub_queries", sub_queries)
+            if draft and parse_documents(node_update.get("context", [])):
+                refined = True
+            context.extend(node_update.get("context", []))
+            sources.extend(node_update.get("sources", []))
+            retrieval_status.extend(node_update.get("retrieval_status", []))
+            timings.extend(node_update.get("timings", []))
+            # The last Deduplicate update holds the context the answer should use
+            if "unique_context" in node_update:
+                context, sources = list(node_update["unique_context"]), list(node_update["unique_sources"])
+            if node in pending and "retrieval_status" in node_update:
+                pending.discard(node)
+                if PROGRESSIVE_ANSWERS and candidate is None and parse_documents(node_update.get("context", [])):
+                    candidate = (node, node_update)
+        # A draft is only worth streaming while a retriever is still running and nothing else is about to arrive
+        if candidate is not None and not draft and pending and not updates.arriving(PROGRESSIVE_DRAFT_GRACE):
+            node, node_update = candidate
+            yield from _stream_draft(state, node, node_update.get("context", []),
+                                     node_update.get("sources", []), draft)
+            timings.append(draft.pop("timing"))
+    if draft:
+        draft["refined"] = refined
+        # Whether the draft stands as the answer; set once it has passed
+        draft["final"] = False
+    yield {"type": "sources", "sources": sources, "retrieval_status": retrieval_status, "route": route}
+    
+    span = tracer.start_span(state["request_id"], "Generate_Answer")
+    span.context_bytes = sum(len(c.encode("utf-8")) for c in context if isinstance(c, str))
+    logger.info("Streaming answer from context")
+    parts = []
+    model_route = None
+    degraded_reason = "all retrievers failed" if _retrieval_failed(context, retrieval_status) else None
+    # Nothing was retrieved after a complete draft started, so it was written from the whole context
+    draft_final = draft.get("assessment") is not None and not refined
+    try:
+        if degraded_reason is None and draft_final and small_llm is None:
+            # Without a cascade the draft came from the large model, as the full answer would
+            draft["final"] = True
+            parts.append(draft["answer"])
+            yield {"type": "token", "content": draft["answer"]}
+        elif degraded_reason is None:
+            messages = build_answer_messages(question, context)
+            span.prompt_tokens = prompt_tokens(messages)
+            small_answer, assessment, small_seconds = None, None, 0.0
+            if draft_final:
+                # The streamed draft is already the small model's answer to this context
+                small_answer, assessment, small_seconds = draft["answer"], draft["assessment"], draft["seconds"]
+            elif small_llm is not None:
+                # Streamed as a draft rather than graded before anything is shown, so the first token
+                # arrives at the small model's speed; the large model's answer replaces it if escalated
+                cascade_draft = {}
+                yield from _stream_draft(state, "Generate_Answer", context, sources, cascade_draft, stage="cascade")
+                timings.append(cascade_draft.pop("timing"))
+                small_answer, assessment = cascade_draft["answer"], cascade_draft["assessment"]
+                small_seconds = cascade_draft["seconds"]
+            if assessment is not None and not assessment["escalate"]:
+                if draft_final:
+                    draft["final"] = True
+                parts.append(small_answer)
+                yield {"type": "token", "content": small_answer}
+                model_route = routing_report(assessment, small_seconds, None)
+            else:
+                started_at = time.time()
+                for chunk in stream_with_retries("groq", lambda: _stream_llm(messages, priority)):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield {"type": "token", "content": chunk.content}
+                if small_llm is not None:
+                    model_route = routing_report(assessment, small_seconds, time.time() - started_at)
+    except CircuitOpenError as e:
+        degraded_reason = str(e)
+    except Exception as e:
+        logger.error(f"Error streaming answer: {e}")
+        span.status = "error"
+        span.provider_latency = time.time() - span.start
+        timings.append(tracer.end_span(span))
+        error_msg = f"I apologize, but I encountered an error while processing your question. Error details: {str(e)}"
+        yield {"type": "token", "content": error_msg}
+        yield {"type": "done", "answer": "".join(parts) + error_msg, "sources": sources,
+               "retrieval_status": retrieval_status, "timings": timings, "route": route, "sub_queries": sub_queries,
+               "draft": draft or None, "request_id": state["request_id"], "cached": False}
+        return
+    
+    if degraded_reason is not None:
+        span.status = "degraded"
+        span.provider_latency = time.time() - span.start
+        timings.append(tracer.end_span(span))
+        answer = _degraded_answer(state, degraded_reason)["answer"]["content"]
+        yield {"type": "token", "content": answer}
+        yield {"type": "done", "answer": answer, "sources": sources, "retrieval_status": retrieval_status,
+               "timings": timings, "route": route, "sub_queries": sub_queries, "request_id": state["request_id"],
+               "cached": False, "degraded": True}
+        return
+    
+    answer = "".join(parts)
+    span.provider_latency = time.time() - span.start
+    timings.append(tracer.end_span(span))
+    tracer.record_request(state["request_id"], time.time() - state["started_at"])
+    if _retrieval_complete(retrieval_status):
+        _store_answer(question, answer, sources)
+    yield {"type": "done", "answer": answer, "sources": sources, "retrieval_status": retrieval_status,
+           "timings": timings, "route": route, "sub_queries": sub_queries, "model_route": model_route,
+           "draft": draft or None, "request_id": state["request_id"], "cached": False}
+
 
 # Only run the example if this file is executed directly
 if __name__ == "__main__":
     test_question = "What is Machine Learning?"
     logger.info(f"Testing with question: {test_question}")
     
-    response = graph.invoke({"question": test_question})
+    response = answer_question(test_question)
+    answer = response.get('answer', '')
     
     print("\n--- ANSWER ---")
-    print(response.get('answer', {}).content)
+    print(answer.content if hasattr(answer, 'content') else answer)
     
     # Print sources if available
     if 'sources' in response:
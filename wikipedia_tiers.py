@@ -0,0 +1,82 @@
+"""
+Summary-first Wikipedia retrieval.
+
+The first tier fetches only the lead section of the best matching articles.
+The second tier fetches the remaining sections of the same articles, and is
+only used when the lead sections do not cover the question well enough or the
+answer step reports that the context was insufficient.
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, List
+from urllib.parse import unquote
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# "full" loads whole articles up front, "summary" loads lead sections and expands on demand
+WIKIPEDIA_MODE = os.environ.get("WIKIPEDIA_MODE", "full")
+EXPANSION_MIN_COVERAGE = float(os.environ.get("WIKIPEDIA_EXPAND_COVERAGE", 0.6))
+WIKI_URL_PREFIX = "https://en.wikipedia.org/wiki/"
+
+INSUFFICIENT_CONTEXT_PATTERN = re.compile(
+    r"(does not|doesn't|do not|don't) (contain|provide|include|mention|specify)"
+    r"|not (enough|sufficient) information"
+    r"|no (specific )?information (about|on|regarding)",
+    re.IGNORECASE,
+)
+
+
+def fetch_summaries(query: str, max_docs: int = 2) -> List[Dict[str, Any]]:
+    """
+    Fetch the lead sections of the articles that best match the query.
+
+    Returns:
+        Dicts with title, url and content (the lead section)
+    """
+    import wikipedia
+
+    articles = []
+    for title in wikipedia.search(query, results=max_docs):
+        try:
+            summary = wikipedia.summary(title, auto_suggest=False)
+        except (wikipedia.exceptions.DisambiguationError, wikipedia.exceptions.PageError) as e:
+            logger.info(f"Skipping Wikipedia article '{title}': {e.__class__.__name__}")
+            continue
+        articles.append({"title": title, "url": WIKI_URL_PREFIX + title.replace(" ", "_"), "content": summary})
+    return articles
+
+
+def fetch_sections(title: str) -> str:
+    """ Fetch everything after the lead section of an article """
+    import wikipedia
+
+    content = wikipedia.page(title, auto_suggest=False).content
+    match = re.search(r"\n==[^=\n]", content)
+    return content[match.start():].strip() if match else ""
+
+
+def wikipedia_titles(sources: list) -> List[str]:
+    """ Titles of the Wikipedia articles among the retrieved sources """
+    titles = []
+    for source_list in sources:
+        for source in source_list:
+            url = source.get("url") or ""
+            if url.startswith(WIKI_URL_PREFIX):
+                title = unquote(url[len(WIKI_URL_PREFIX):]).replace("_", " ")
+                if title not in titles:
+                    titles.append(title)
+    return titles
+
+
+def context_insufficient(stats: Dict[str, Any]) -> bool:
+    """ Whether passage ranking suggests the retrieved context does not cover the question """
+    return stats.get("passages_total", 0) == 0 or stats.get("coverage", 0.0) < EXPANSION_MIN_COVERAGE
+
+
+def answer_reports_insufficient(answer_text: str) -> bool:
+    """ Whether the generated answer says the context lacked the needed information """
+    return bool(INSUFFICIENT_CONTEXT_PATTERN.search(answer_text or ""))